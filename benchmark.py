@@ -0,0 +1,332 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from git.cmd import Git
+from watchdog.events import FileModifiedEvent
+
+
+# Reproducible benchmark of the sync engine. Everything runs locally: the
+# GitHub API is replaced by fake_github.py and every `origin` is a bare
+# repository on disk, so no token or network is needed. Each scenario
+# reports its wall time, the number of git processes started (every
+# Git.execute call, persistent cat-file processes included), the GitHub API
+# requests made and, for the event pipeline, events per second.
+#
+#   python benchmark.py --projects 20 --files 200 --save baseline.json
+#   python benchmark.py --baseline baseline.json    # exit code 1 on regression
+
+SCENARIOS = ["initial_sync", "noop_rescan", "incremental_sync", "targeted_push",
+             "pull_conflict", "large_files", "event_pipeline"]
+
+
+class GitProcessCounter:
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+        self.original = Git.execute
+
+    def install(self):
+        counter = self
+        original = self.original
+
+        def counting_execute(self, *args, **kwargs):
+            with counter.lock:
+                counter.count += 1
+            return original(self, *args, **kwargs)
+
+        Git.execute = counting_execute
+
+    def uninstall(self):
+        Git.execute = self.original
+
+
+# Isolated environment: temporary HOME (git identity), working directory
+# (state database, caches, locks), project trees and bare remotes
+class BenchmarkEnvironment:
+
+    def __init__(self, args):
+        self.args = args
+        self.root = tempfile.mkdtemp(prefix="sync-bench-")
+        self.parent = os.path.join(self.root, "Projects")
+        self.remotes = os.path.join(self.root, "remotes")
+        self.clones = os.path.join(self.root, "clones")
+        for path in (self.parent, self.remotes, self.clones):
+            os.makedirs(path)
+        self.random = random.Random(args.seed)
+
+        with open(os.path.join(self.root, ".gitconfig"), "w") as f:
+            f.write("[user]\n\tname = Benchmark\n\temail = bench@example.com\n"
+                    "[init]\n\tdefaultBranch = main\n")
+        os.environ.update({
+            "HOME": self.root,
+            "GITHUB_API_TOKEN": "benchmark-token",
+            "GITHUB_USERNAME": "local-user",
+            "GITHUB_EMAIL": "bench@example.com",
+        })
+        os.chdir(self.root)
+
+        from fake_github import FakeGithubServer
+        self.server = FakeGithubServer(self.remotes, rate_limit=0).start()
+        os.environ["GITHUB_API_URL"] = self.server.url
+
+    def project_paths(self):
+        return [os.path.join(self.parent, f"project_{i:04d}") for i in range(self.args.projects)]
+
+    def write_file(self, path, size):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(self.random.randbytes(size))
+
+    def generate_projects(self):
+        for project_path in self.project_paths():
+            for j in range(self.args.files):
+                # Quelques sous-dossiers pour des arborescences réalistes
+                subdir = f"src/module_{j % 10}" if j % 3 else "docs"
+                self.write_file(os.path.join(project_path, subdir, f"file_{j:05d}.txt"), self.args.file_size)
+            for j in range(self.args.binaries):
+                self.write_file(os.path.join(project_path, "assets", f"blob_{j}.bin"), self.args.binary_size)
+
+    def api_requests(self):
+        return sum(self.server.request_counts.values())
+
+    def close(self):
+        self.server.stop()
+        os.chdir(os.path.dirname(self.root))
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def run_quietly(verbose, function, *args, **kwargs):
+    if verbose:
+        return function(*args, **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+class Benchmark:
+
+    def __init__(self, args):
+        self.args = args
+        self.env = BenchmarkEnvironment(args)
+        self.counter = GitProcessCounter()
+        self.results = {}
+
+        import sync_script
+        self.sync = sync_script
+        sync_script.PARENT_DIRECTORIES = [self.env.parent]
+        self.github_client = sync_script.make_github_client("benchmark-token", pool_size=args.workers)
+        self.catalog = sync_script.GithubRepoCatalog(self.github_client, cache_file=None)
+        self.state = {}
+
+    def measure(self, name, function, events=None):
+        git_before = self.counter.count
+        api_before = self.env.api_requests()
+        start = time.perf_counter()
+        extra = run_quietly(self.args.verbose, function) or {}
+        elapsed = time.perf_counter() - start
+
+        result = {
+            "wall_seconds": round(elapsed, 4),
+            "git_processes": self.counter.count - git_before,
+            "api_requests": self.env.api_requests() - api_before,
+        }
+        if events:
+            result["events_per_second"] = round(events / elapsed)
+        result.update(extra)
+        self.results[name] = result
+        print(f"  {name:<18} {elapsed:8.3f}s  git={result['git_processes']:<6} api={result['api_requests']:<5}"
+              + (f" events/s={result['events_per_second']}" if events else ""))
+
+    def sync_all(self, incremental=True):
+        self.sync.sync_projects(self.github_client, "local-user", self.state, workers=self.args.workers,
+                                catalog=self.catalog, incremental=incremental)
+
+    # --- scenarios ------------------------------------------------------------
+
+    def initial_sync(self):
+        self.sync_all()
+
+    def noop_rescan(self):
+        self.sync_all()
+
+    def incremental_sync(self):
+        for project_path in self.env.project_paths():
+            for j in range(min(self.args.touch, self.args.files)):
+                path = os.path.join(project_path, "docs", f"touched_{j}.txt")
+                self.env.write_file(path, self.args.file_size)
+        self.sync_all()
+
+    def targeted_push(self):
+        for project_path in self.env.project_paths():
+            path = os.path.join(project_path, "docs", "targeted.txt")
+            self.env.write_file(path, self.args.file_size)
+            with self.sync.lease_repo(project_path):
+                self.sync.push_updates(project_path, f"Auto-sync: {os.path.basename(project_path)}",
+                                       [path], [], self.state.get(project_path))
+
+    def prepare_conflicts(self):
+        conflicted = self.env.project_paths()[:self.args.conflicts]
+        for project_path in conflicted:
+            name = os.path.basename(project_path)
+            entry = self.state[project_path]
+            bare = os.path.join(self.env.remotes, f"{entry['repo_name']}.git")
+            clone = os.path.join(self.env.clones, name)
+            subprocess.run(["git", "clone", "-q", bare, clone], check=True)
+            with open(os.path.join(clone, "docs", "targeted.txt"), "w") as f:
+                f.write("remote version\n")
+            subprocess.run(["git", "-C", clone, "commit", "-qam", "remote edit"], check=True)
+            subprocess.run(["git", "-C", clone, "push", "-q"], check=True)
+            with open(os.path.join(project_path, "docs", "targeted.txt"), "w") as f:
+                f.write("local version\n")
+        return conflicted
+
+    def pull_conflict(self, conflicted):
+        for project_path in conflicted:
+            with self.sync.lease_repo(project_path):
+                self.sync.push_updates(project_path, f"Auto-sync: {os.path.basename(project_path)}",
+                                       project_state=self.state.get(project_path))
+
+    def large_files(self):
+        self.sync.MAX_FILE_SIZE = self.args.binary_size
+        for project_path in self.env.project_paths():
+            self.env.write_file(os.path.join(project_path, "assets", "too_large.bin"), self.args.binary_size * 2)
+            with self.sync.lease_repo(project_path):
+                self.sync.push_updates(project_path, f"Auto-sync: {os.path.basename(project_path)}",
+                                       project_state=self.state.get(project_path))
+
+    def event_pipeline(self):
+        import watch_and_sync
+
+        context = self.sync.SyncContext(pool_size=self.args.workers)
+        handler = watch_and_sync.ChangeHandler(context, [self.env.parent])
+        synced = []
+        handler.scheduler.sync_function = lambda project_path, *paths: synced.append(project_path)
+
+        projects = self.env.project_paths()
+        files = [f"src/module_{j % 10}/file_{j:05d}.txt" for j in range(self.args.files)]
+        for i in range(self.args.events):
+            path = os.path.join(projects[i % len(projects)], files[(i // len(projects)) % len(files)])
+            handler.dispatch(FileModifiedEvent(path))
+        handler.events.put(None)
+        handler.pipeline.join()
+
+        handler.scheduler.stop()
+        context.close()
+        return {"events_overflowed": handler.events_overflowed, "syncs_scheduled": len(synced)}
+
+    # ---------------------------------------------------------------------------
+
+    def run(self, scenarios):
+        print(f"Generating {self.args.projects} projects x {self.args.files} files "
+              f"(+{self.args.binaries} binaries of {self.args.binary_size} bytes)...")
+        self.env.generate_projects()
+        self.counter.install()
+        try:
+            print("Scenario              wall    git processes / API requests")
+            self.measure("initial_sync", self.initial_sync)
+            for name in scenarios:
+                if name == "noop_rescan":
+                    time.sleep(self.sync.WATERMARK_SLACK_NS / 1e9)   # les repères couvrent le passage précédent
+                    self.measure(name, self.noop_rescan)
+                elif name == "incremental_sync":
+                    self.measure(name, self.incremental_sync)
+                elif name == "targeted_push":
+                    self.measure(name, self.targeted_push)
+                elif name == "pull_conflict":
+                    if "targeted_push" not in self.results:
+                        run_quietly(self.args.verbose, self.targeted_push)
+                    conflicted = self.prepare_conflicts()
+                    self.measure(name, lambda: self.pull_conflict(conflicted))
+                elif name == "large_files":
+                    self.measure(name, self.large_files)
+                elif name == "event_pipeline":
+                    self.measure(name, self.event_pipeline, events=self.args.events)
+        finally:
+            self.counter.uninstall()
+            self.sync.close_repos()
+            self.sync.get_state_store().close()
+            self.github_client.close()
+            self.env.close()
+        return self.results
+
+
+# Compare with a saved run: more git processes or API requests, a wall time
+# over the tolerance, or fewer events/s are reported as regressions
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            continue
+        for key in ("git_processes", "api_requests"):
+            if result[key] > reference[key]:
+                regressions.append(f"{name}: {key} {reference[key]} -> {result[key]}")
+        if result["wall_seconds"] > reference["wall_seconds"] * (1 + tolerance):
+            regressions.append(f"{name}: wall time {reference['wall_seconds']}s -> {result['wall_seconds']}s")
+        if "events_per_second" in reference and \
+                result.get("events_per_second", 0) < reference["events_per_second"] / (1 + tolerance):
+            regressions.append(f"{name}: events/s {reference['events_per_second']} -> {result['events_per_second']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sync engine against local remotes.")
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--files", type=int, default=100, help="text files per project")
+    parser.add_argument("--file-size", type=int, default=2048)
+    parser.add_argument("--binaries", type=int, default=2, help="binary files per project")
+    parser.add_argument("--binary-size", type=int, default=1024 * 1024)
+    parser.add_argument("--touch", type=int, default=5, help="files modified per project in incremental_sync")
+    parser.add_argument("--conflicts", type=int, default=3, help="projects with a conflicting remote edit")
+    parser.add_argument("--events", type=int, default=100000, help="file events sent through the pipeline")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with a JSON file written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the sync functions")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    cwd = os.getcwd()
+    results = Benchmark(args).run(scenarios)
+    os.chdir(cwd)
+
+    report = {"parameters": {key: value for key, value in vars(args).items()
+                             if key not in ("save", "baseline", "verbose")},
+              "results": results}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Results written to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("✗ Regressions:")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print("✓ No regression against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
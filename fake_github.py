@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# Local stand-in for the parts of the GitHub REST API used by sync_script:
+# GET /user, GET /user/repos (paginated), POST /user/repos and
+# GET /repos/<owner>/<name>. Created repositories are local bare git
+# repositories, so clone/pull/push work without network. Responses carry
+# X-RateLimit-* headers and every request is counted per endpoint.
+#
+# Use it by exporting GITHUB_API_URL=<server url> before running the scripts.
+class FakeGithubServer:
+
+    def __init__(self, repos_root, username="local-user", host="127.0.0.1", port=0, rate_limit=5000):
+        self.repos_root = os.path.abspath(repos_root)
+        self.username = username
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset_time = int(time.time()) + 3600
+        self.request_counts = {}
+        self.lock = threading.Lock()
+        os.makedirs(self.repos_root, exist_ok=True)
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-github", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def repo_path(self, name):
+        return os.path.join(self.repos_root, f"{name}.git")
+
+    def repo_json(self, name, base_url):
+        path = self.repo_path(name)
+        return {
+            "id": zlib.crc32(name.encode("utf-8")),
+            "name": name,
+            "full_name": f"{self.username}/{name}",
+            "private": True,
+            "owner": {"login": self.username},
+            "clone_url": path,
+            "html_url": f"{base_url}/{self.username}/{name}",
+            "url": f"{base_url}/repos/{self.username}/{name}",
+        }
+
+    def list_repos(self):
+        return sorted(entry[:-4] for entry in os.listdir(self.repos_root) if entry.endswith(".git"))
+
+    def create_repo(self, name):
+        with self.lock:
+            path = self.repo_path(name)
+            if os.path.exists(path):
+                return False
+            subprocess.run(["git", "init", "-q", "--bare", path], check=True)
+            return True
+
+    # Count a request; False once the quota is exhausted (rate_limit=0: unlimited)
+    def count_request(self, endpoint):
+        with self.lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+            if not self.rate_limit:
+                return True
+            if self.remaining == 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def _make_handler(server):
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def base_url(self):
+                return f"http://{self.headers.get('Host')}"
+
+            def send_json(self, status, payload, extra_headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("X-RateLimit-Limit", str(server.rate_limit))
+                self.send_header("X-RateLimit-Remaining", str(server.remaining))
+                self.send_header("X-RateLimit-Reset", str(server.reset_time))
+                for key, value in (extra_headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def check_quota(self, endpoint):
+                if server.count_request(endpoint):
+                    return True
+                self.send_json(403, {"message": "API rate limit exceeded"})
+                return False
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+
+                if parsed.path == "/user":
+                    if self.check_quota("GET /user"):
+                        self.send_json(200, {"login": server.username, "id": 1, "type": "User"})
+                    return
+
+                if parsed.path == "/user/repos":
+                    if not self.check_quota("GET /user/repos"):
+                        return
+                    per_page = int(query.get("per_page", ["30"])[0])
+                    page = int(query.get("page", ["1"])[0])
+                    names = server.list_repos()
+                    chunk = names[(page - 1) * per_page:page * per_page]
+                    headers = {}
+                    if page * per_page < len(names):
+                        headers["Link"] = (f'<{self.base_url()}/user/repos?per_page={per_page}&page={page + 1}>; '
+                                           f'rel="next"')
+                    self.send_json(200, [server.repo_json(name, self.base_url()) for name in chunk], headers)
+                    return
+
+                match = re.fullmatch(r"/repos/([^/]+)/([^/]+)", parsed.path)
+                if match:
+                    if not self.check_quota("GET /repos"):
+                        return
+                    name = match.group(2)
+                    if os.path.exists(server.repo_path(name)):
+                        self.send_json(200, server.repo_json(name, self.base_url()))
+                    else:
+                        self.send_json(404, {"message": "Not Found"})
+                    return
+
+                self.send_json(404, {"message": "Not Found"})
+
+            def do_POST(self):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+
+                if parsed.path == "/user/repos":
+                    if not self.check_quota("POST /user/repos"):
+                        return
+                    name = payload.get("name", "")
+                    if not re.fullmatch(r"[A-Za-z0-9._-]+", name):
+                        self.send_json(422, {"message": "Validation Failed", "errors": [{"field": "name"}]})
+                    elif server.create_repo(name):
+                        self.send_json(201, server.repo_json(name, self.base_url()))
+                    else:
+                        self.send_json(422, {
+                            "message": "Repository creation failed.",
+                            "errors": [{"resource": "Repository", "field": "name",
+                                        "message": "name already exists on this account"}]
+                        })
+                    return
+
+                self.send_json(404, {"message": "Not Found"})
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the GitHub API.")
+    parser.add_argument("--root", default="fake_github_repos", help="directory holding the bare repositories")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--username", default="local-user")
+    args = parser.parse_args()
+
+    server = FakeGithubServer(args.root, username=args.username, port=args.port).start()
+    print(f"Fake GitHub API listening on {server.url} (repositories in {server.repos_root})")
+    print(f"export GITHUB_API_URL={server.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
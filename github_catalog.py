@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from state_store import atomic_write_json, read_json
+from metrics import inc, observe, set_gauge, span
+
+
+CATALOG_CACHE_FILE = "github_repos_cache.json"
+CATALOG_TTL = 3600
+GITHUB_REQUEST_RATE = 5      # requêtes par seconde en régime normal
+GITHUB_REQUEST_BURST = 20
+
+
+# Token bucket limiting GitHub API calls. The refill rate is lowered to
+# spread the remaining quota until the reset time announced by GitHub in
+# the X-RateLimit-* headers, and calls block until the reset when the
+# quota is exhausted.
+class TokenBucket:
+
+    def __init__(self, rate=GITHUB_REQUEST_RATE, capacity=GITHUB_REQUEST_BURST):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                wait_reset = self.blocked_until - time.time()
+                if wait_reset <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(wait_reset, (1 - self.tokens) / self.rate)
+
+            if wait > 5:
+                print(f"⏳ GitHub rate limit: waiting {wait:.0f}s...")
+            time.sleep(wait)
+
+    # remaining/limit/reset come from the last API response headers
+    def update(self, remaining, limit, reset_time):
+        if remaining < 0 or limit <= 0:
+            return
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, remaining)
+            if remaining == 0:
+                self.blocked_until = reset_time
+                return
+            seconds_left = max(1.0, reset_time - time.time())
+            self.rate = min(self.base_rate, remaining / seconds_left)
+
+    def update_from_client(self, github_client):
+        requester = github_client.requester
+        remaining, limit = requester.rate_limiting
+        set_gauge("github_rate_limit_remaining", remaining)
+        self.update(remaining, limit, requester.rate_limiting_resettime)
+
+
+default_limiter = TokenBucket()
+
+
+# Run one GitHub API call through the limiter
+def rate_limited(github_client, call, limiter=None):
+    limiter = limiter or default_limiter
+    start = time.perf_counter()
+    limiter.acquire()
+    observe("github_rate_limit_wait_seconds", time.perf_counter() - start)
+    inc("github_requests_total")
+    try:
+        with span("github_api"):
+            return call()
+    finally:
+        limiter.update_from_client(github_client)
+
+
+# Names and clone URLs of the user's repositories, listed once (paginated)
+# and cached on disk with a TTL, so existing repositories are resolved
+# without any API call. Clone URLs are cached without the token.
+class GithubRepoCatalog:
+
+    def __init__(self, github_client, cache_file=CATALOG_CACHE_FILE, ttl=CATALOG_TTL, limiter=None):
+        self.github_client = github_client
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.limiter = limiter or default_limiter
+        self.repos = {}
+        self.fetched_at = 0
+        self.lock = threading.Lock()
+
+        cached = read_json(cache_file) if cache_file else {}
+        if cached and time.time() - cached.get("fetched_at", 0) < ttl:
+            self.repos = cached.get("repos", {})
+            self.fetched_at = cached["fetched_at"]
+
+    def is_fresh(self):
+        return self.fetched_at and time.time() - self.fetched_at < self.ttl
+
+    def refresh(self, force=False):
+        with self.lock:
+            if self.is_fresh() and not force:
+                return
+
+            repos = {}
+            user = self.github_client.get_user()
+            paginated = user.get_repos(affiliation="owner")
+            page = 0
+            while True:
+                # Une requête par page de résultats
+                items = rate_limited(self.github_client, lambda: paginated.get_page(page), self.limiter)
+                for repo in items:
+                    repos[repo.name.lower()] = repo.clone_url
+                if len(items) < self.github_client.per_page:
+                    break
+                page += 1
+
+            self.repos = repos
+            self.fetched_at = time.time()
+            print(f"GitHub catalog refreshed: {len(repos)} repositories.")
+            self._save()
+
+    def _save(self):
+        if self.cache_file:
+            atomic_write_json(self.cache_file, {"fetched_at": self.fetched_at, "repos": self.repos})
+
+    def lookup(self, repo_name):
+        if not self.is_fresh():
+            self.refresh()
+        with self.lock:
+            return self.repos.get(repo_name.lower())
+
+    def add(self, repo_name, clone_url):
+        with self.lock:
+            self.repos[repo_name.lower()] = clone_url
+            self._save()
+
+
+# Insert the API token into an https clone URL
+def authenticated_url(clone_url):
+    token = os.getenv("GITHUB_API_TOKEN")
+    return clone_url.replace("https://", f"https://{token}@")
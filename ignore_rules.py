@@ -0,0 +1,268 @@
+import os
+import re
+import threading
+
+
+# Translate a gitignore glob into a regex body ('/' is never matched by * or ?)
+def translate_glob(pattern):
+    regex = []
+    i = 0
+    n = len(pattern)
+
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            regex.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == n:
+            regex.append("/.*")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            regex.append("[^/]*")
+        elif c == "?":
+            regex.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern[i + 1:i + 2] in ("!", "^") else i + 1)
+            if end == -1:
+                regex.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body[:1] in ("!", "^"):
+                    body = "^" + body[1:]
+                regex.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            regex.append(re.escape(pattern[i]))
+        else:
+            regex.append(re.escape(c))
+        i += 1
+
+    return "".join(regex)
+
+
+# Trailing spaces are dropped unless the last one is escaped ("\ ")
+def strip_trailing_spaces(line):
+    stripped = line.rstrip()
+    if stripped != line:
+        backslashes = len(stripped) - len(stripped.rstrip("\\"))
+        if backslashes % 2:
+            return stripped + line[len(stripped)]
+    return stripped
+
+
+# One parsed gitignore line
+class IgnoreRule:
+
+    __slots__ = ("negate", "dir_only", "anchored", "regex", "compiled", "source")
+
+    def __init__(self, line):
+        self.source = line
+        pattern = line
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        elif pattern.startswith("\\"):
+            pattern = pattern[1:]
+
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+
+        # Un motif contenant un '/' est ancré à la racine du projet,
+        # sinon il s'applique au nom de chaque élément du chemin
+        self.anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        self.regex = translate_glob(pattern)
+        self.compiled = re.compile(self.regex)
+
+    def matches(self, name, rel_path, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        target = rel_path if self.anchored else name
+        return self.compiled.fullmatch(target) is not None
+
+
+# Precompiled matcher for one project. Rules follow .gitignore semantics:
+# last matching rule wins, '!' re-includes, a trailing '/' matches only
+# directories, and nothing below an ignored directory can be re-included.
+# Without negations all rules are folded into one regex per target
+# (component name / anchored path), so a path costs O(depth) regex matches.
+#
+# With project_path, the .gitignore of each subfolder is read on first use,
+# relative to its folder: the deepest file with a matching rule decides,
+# then the root rules. clear_nested() drops these files after a change.
+class IgnoreMatcher:
+
+    def __init__(self, lines, project_path=None):
+        self.project_path = project_path
+        self.nested = {}   # folder (relative) -> IgnoreMatcher of its .gitignore, None without rules
+        self.rules = []
+        for line in lines:
+            line = strip_trailing_spaces(line.rstrip("\r\n"))
+            if line and not line.startswith("#"):
+                self.rules.append(IgnoreRule(line))
+
+        self.has_negations = any(rule.negate for rule in self.rules)
+        self.name_any = self._combine(r for r in self.rules if not r.anchored and not r.dir_only)
+        self.name_dir = self._combine(r for r in self.rules if not r.anchored and r.dir_only)
+        self.path_any = self._combine(r for r in self.rules if r.anchored and not r.dir_only)
+        self.path_dir = self._combine(r for r in self.rules if r.anchored and r.dir_only)
+
+    @staticmethod
+    def _combine(rules):
+        parts = [f"(?:{rule.regex})" for rule in rules]
+        return re.compile("|".join(parts)) if parts else None
+
+    def _match_one(self, name, rel_path, is_dir):
+        if self.has_negations:
+            ignored = False
+            for rule in self.rules:
+                if rule.matches(name, rel_path, is_dir):
+                    ignored = not rule.negate
+            return ignored
+
+        for regex, target, dirs_only in (
+            (self.name_any, name, False),
+            (self.path_any, rel_path, False),
+            (self.name_dir, name, True),
+            (self.path_dir, rel_path, True),
+        ):
+            if regex is not None and (is_dir or not dirs_only) and regex.fullmatch(target):
+                return True
+        return False
+
+    # Outcome of the last matching rule: True (ignored), False (re-included)
+    # or None when no rule matches
+    def verdict(self, name, rel_path, is_dir):
+        result = None
+        for rule in self.rules:
+            if rule.matches(name, rel_path, is_dir):
+                result = not rule.negate
+        return result
+
+    def _nested_rules(self, rel_dir):
+        nested = self.nested
+        if rel_dir not in nested:
+            matcher = IgnoreMatcher(read_rule_lines(os.path.join(self.project_path, rel_dir, ".gitignore")))
+            nested[rel_dir] = matcher if matcher.rules else None
+        return nested[rel_dir]
+
+    def clear_nested(self):
+        self.nested = {}
+
+    def _match_in_tree(self, parent, name, rel_path, is_dir):
+        folder = parent
+        while folder:
+            rules = self._nested_rules(folder)
+            if rules is not None:
+                result = rules.verdict(name, rel_path[len(folder) + 1:], is_dir)
+                if result is not None:
+                    return result
+            folder = folder.rpartition("/")[0]
+        return self._match_one(name, rel_path, is_dir)
+
+    # rel_path is relative to the project root, with '/' separators
+    def match(self, rel_path, is_dir=False):
+        parts = rel_path.split("/")
+        prefix = ""
+        for depth, name in enumerate(parts):
+            parent = prefix
+            prefix = f"{prefix}/{name}" if prefix else name
+            last = depth == len(parts) - 1
+            if self.project_path is not None and parent:
+                ignored = self._match_in_tree(parent, name, prefix, is_dir or not last)
+            else:
+                ignored = self._match_one(name, prefix, is_dir or not last)
+            if ignored:
+                return True
+        return False
+
+
+# Files whose rules are merged into a project's matcher, lowest precedence
+# first (the .gitignore of subfolders are read by the matcher itself)
+def rule_files(project_path):
+    return (
+        os.path.join(project_path, ".git", "info", "exclude"),
+        os.path.join(project_path, ".gitignore"),
+    )
+
+
+# Lines of a rule file. The lines between the markers of skip_block (a
+# section managed by the script itself) are left out.
+def read_rule_lines(path, skip_block=None):
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            lines = f.readlines()
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return []
+    if skip_block is None:
+        return lines
+
+    begin, end = skip_block
+    kept, inside = [], False
+    for line in lines:
+        marker = line.rstrip("\r\n")
+        if marker == begin:
+            inside = True
+        elif marker == end:
+            inside = False
+        elif not inside:
+            kept.append(line)
+    return kept
+
+
+def rule_files_signature(project_path):
+    signature = []
+    for path in rule_files(project_path):
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+# Cache of matchers, one per project, rebuilt only when the rules read from
+# its rule files change. A write that only touches skip_block (or leaves the
+# rules as they were) keeps the same matcher object.
+class IgnoreMatcherCache:
+
+    def __init__(self, base_patterns, skip_block=None):
+        self.base_patterns = list(base_patterns)
+        self.skip_block = skip_block
+        self.matchers = {}   # project_path -> (signature, matcher, rule lines)
+        self.lock = threading.Lock()
+
+    # With revalidate=False the cached matcher is returned without any stat:
+    # the watcher revalidates once per batch of events instead. Revalidating
+    # also makes the matcher read the .gitignore of subfolders again.
+    def get(self, project_path, revalidate=False):
+        project_path = os.path.abspath(project_path)
+        with self.lock:
+            cached = self.matchers.get(project_path)
+        if cached is not None and not revalidate:
+            return cached[1]
+
+        signature = rule_files_signature(project_path)
+        if cached is not None and cached[0] == signature:
+            cached[1].clear_nested()
+            return cached[1]
+
+        lines = list(self.base_patterns)
+        for path in rule_files(project_path):
+            lines.extend(read_rule_lines(path, self.skip_block))
+        if cached is not None and cached[2] == lines:
+            matcher = cached[1]
+            matcher.clear_nested()
+        else:
+            matcher = IgnoreMatcher(lines, project_path)
+
+        with self.lock:
+            self.matchers[project_path] = (signature, matcher, lines)
+        return matcher
@@ -0,0 +1,334 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+from watchdog.events import (
+    DirCreatedEvent, DirDeletedEvent, DirMovedEvent,
+    FileCreatedEvent, FileDeletedEvent, FileModifiedEvent, FileMovedEvent
+)
+
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+def inotify_available():
+    return _libc is not None
+
+
+# Inotify watcher that only watches non-ignored directories, one
+# non-recursive watch per directory, all on a single inotify descriptor.
+# Ignored subtrees (node_modules, .venv, .git...) never get a watch, so
+# their events are never produced. Events are delivered to the handler as
+# regular watchdog events, like with watchdog's Observer.
+#
+# is_ignored(path, is_dir) decides what is pruned. Parent directories are
+# watched so that new projects are picked up.
+class PrunedInotifyWatcher:
+
+    def __init__(self, handler, parents, is_ignored):
+        if _libc is None:
+            raise OSError("inotify is not available on this platform")
+
+        self.handler = handler
+        self.parents = {os.path.abspath(parent) for parent in parents}
+        self.is_ignored = is_ignored
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        self.wd_to_path = {}
+        self.path_to_wd = {}
+        self.pruned_dirs = 0
+        self.events_dropped = 0
+        self.events_delivered = 0
+        self.watch_errors = 0
+        self.limit_warned = False
+        self.rescans = set()   # projects whose ignore rules changed
+        self.rescans_lock = threading.Lock()
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="inotify-watcher", daemon=True)
+
+    # --- watch management -------------------------------------------------
+
+    def _add_watch(self, path):
+        if path in self.path_to_wd:
+            return True
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            self.watch_errors += 1
+            if err == errno.ENOSPC and not self.limit_warned:
+                self.limit_warned = True
+                print("⚠ inotify watch limit reached (fs.inotify.max_user_watches). Some folders are not watched.")
+            return False
+        self.wd_to_path[wd] = path
+        self.path_to_wd[path] = wd
+        return True
+
+    def _forget_tree(self, path):
+        prefix = path + os.sep
+        for watched in [p for p in self.path_to_wd if p == path or p.startswith(prefix)]:
+            wd = self.path_to_wd.pop(watched)
+            self.wd_to_path.pop(wd, None)
+            _libc.inotify_rm_watch(self.fd, wd)
+
+    # Watch a directory and its non-ignored subdirectories. With emit=True the
+    # files found are reported as created (they may have been written before
+    # the watch existed).
+    def _add_tree(self, root, emit=False):
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            if not self._add_watch(directory):
+                continue
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.is_ignored(entry.path, True):
+                                self.pruned_dirs += 1
+                            else:
+                                pending.append(entry.path)
+                                if emit:
+                                    self._deliver(DirCreatedEvent(entry.path))
+                        elif emit:
+                            if self.is_ignored(entry.path, False):
+                                self.events_dropped += 1
+                            else:
+                                self._deliver(FileCreatedEvent(entry.path))
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+
+    # Bring the watches of a project back in line with its ignore rules:
+    # folders ignored now lose their watches, folders no longer ignored get one
+    def _reprune(self, root):
+        if root not in self.path_to_wd:
+            return
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if not entry.is_dir(follow_symlinks=False):
+                            continue
+                        watched = entry.path in self.path_to_wd
+                        if self.is_ignored(entry.path, True):
+                            if watched:
+                                self._forget_tree(entry.path)
+                                self.pruned_dirs += 1
+                        elif watched:
+                            pending.append(entry.path)
+                        else:
+                            self._add_tree(entry.path)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+
+    # Called from any thread; applied by the watcher thread
+    def request_rescan(self, project_path):
+        with self.rescans_lock:
+            self.rescans.add(os.path.abspath(project_path))
+
+    def _apply_rescans(self):
+        with self.rescans_lock:
+            rescans, self.rescans = self.rescans, set()
+        for project_path in rescans:
+            self._reprune(project_path)
+
+    def _is_project_root(self, path):
+        return os.path.dirname(path) in self.parents
+
+    def _watch_parent(self, parent):
+        self._add_watch(parent)
+        try:
+            with os.scandir(parent) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'):
+                        self._add_tree(entry.path)
+        except (FileNotFoundError, PermissionError) as e:
+            print(f"Cannot watch {parent}: {e}")
+
+    def project_roots(self):
+        return [path for path in self.path_to_wd if self._is_project_root(path)]
+
+    def stats(self):
+        return {
+            "watches": len(self.wd_to_path),
+            "pruned_dirs": self.pruned_dirs,
+            "events_dropped": self.events_dropped,
+            "events_delivered": self.events_delivered,
+            "watch_errors": self.watch_errors,
+        }
+
+    def report(self):
+        stats = self.stats()
+        print(f"👁 {stats['watches']} inotify watches, {stats['pruned_dirs']} ignored folders pruned, "
+              f"{stats['events_dropped']} events dropped at source, {stats['events_delivered']} delivered.")
+
+    # --- event loop -------------------------------------------------------
+
+    def _deliver(self, event):
+        self.events_delivered += 1
+        self.handler.dispatch(event)
+
+    def _read_events(self):
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def _handle_batch(self, events):
+        # Les paires MOVED_FROM / MOVED_TO d'un même lot partagent un cookie
+        moved_to = {}
+        for wd, mask, cookie, name in events:
+            if mask & IN_MOVED_TO and wd in self.wd_to_path:
+                moved_to[cookie] = os.path.join(self.wd_to_path[wd], name)
+
+        for wd, mask, cookie, name in events:
+            if mask & IN_Q_OVERFLOW:
+                print("⚠ inotify queue overflow: scheduling a full sync of every project.")
+                for project_path in self.project_roots():
+                    self.handler.schedule_sync(project_path)
+                continue
+
+            directory = self.wd_to_path.get(wd)
+            if directory is None:
+                continue
+
+            if mask & (IN_IGNORED | IN_DELETE_SELF):
+                if mask & IN_IGNORED or directory not in self.parents:
+                    self.path_to_wd.pop(directory, None)
+                    self.wd_to_path.pop(wd, None)
+                continue
+            if mask & IN_MOVE_SELF or not name:
+                continue
+
+            path = os.path.join(directory, name)
+            is_dir = bool(mask & IN_ISDIR)
+
+            if directory in self.parents:
+                # Nouveau projet directement sous un dossier parent
+                if is_dir and mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith('.'):
+                    self._add_tree(path, emit=True)
+                elif is_dir and mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._forget_tree(path)
+                else:
+                    self.events_dropped += 1
+                continue
+
+            if self.is_ignored(path, is_dir):
+                self.events_dropped += 1
+                continue
+
+            if mask & IN_MOVED_FROM:
+                destination = moved_to.pop(cookie, None)
+                if is_dir:
+                    self._forget_tree(path)
+                if destination is not None and not self.is_ignored(destination, is_dir):
+                    if is_dir:
+                        self._add_tree(destination)
+                        self._deliver(DirMovedEvent(path, destination))
+                    else:
+                        self._deliver(FileMovedEvent(path, destination))
+                else:
+                    self._deliver(DirDeletedEvent(path) if is_dir else FileDeletedEvent(path))
+            elif mask & IN_MOVED_TO:
+                if cookie in moved_to:
+                    # Arrivée d'un déplacement dont la source n'est pas surveillée
+                    moved_to.pop(cookie)
+                    if is_dir:
+                        self._add_tree(path, emit=True)
+                    self._deliver(DirCreatedEvent(path) if is_dir else FileCreatedEvent(path))
+            elif mask & IN_CREATE:
+                if is_dir:
+                    self._add_tree(path, emit=True)
+                    self._deliver(DirCreatedEvent(path))
+                else:
+                    self._deliver(FileCreatedEvent(path))
+            elif mask & IN_DELETE:
+                if is_dir:
+                    self._forget_tree(path)
+                self._deliver(DirDeletedEvent(path) if is_dir else FileDeletedEvent(path))
+            elif mask & (IN_MODIFY | IN_CLOSE_WRITE) and not is_dir:
+                self._deliver(FileModifiedEvent(path))
+
+    def _run(self):
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        while not self.stop_event.is_set():
+            ready = poller.poll(500)
+            try:
+                self._apply_rescans()
+                if ready:
+                    self._handle_batch(self._read_events())
+            except Exception as e:
+                print(f"✗ Error while handling inotify events: {e}")
+
+    # --- Observer-like interface -------------------------------------------
+
+    def start(self):
+        for parent in sorted(self.parents):
+            self._watch_parent(parent)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+        if not self.thread.is_alive() and self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def is_alive(self):
+        return self.thread.is_alive()
@@ -0,0 +1,315 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from state_store import atomic_write_json
+
+
+METRICS_HOST = "127.0.0.1"
+PROFILE_DIR = "profiles"
+PROFILE_TOP = 25   # fonctions affichées après une capture cProfile
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)   # dernier seau : +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+# In-process counters, gauges and histograms. A metric is identified by its
+# name and labels; gauge functions (queue depths...) are read at collection
+# time. Collected as a JSON snapshot or in the Prometheus text format.
+class MetricsRegistry:
+
+    def __init__(self):
+        self.counters = {}    # (name, labels) -> value
+        self.gauges = {}      # (name, labels) -> value or callable
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    # Duration of one phase of a sync (scan, add, commit, pull, push...).
+    # Phases can be nested: the pull span includes its conflict resolution.
+    @contextmanager
+    def span(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("sync_phase_errors_total", phase=phase)
+            raise
+        finally:
+            self.observe("sync_phase_seconds", time.perf_counter() - start, phase=phase)
+
+    def _gauge_values(self):
+        with self.lock:
+            gauges = list(self.gauges.items())
+        values = []
+        for key, value in gauges:
+            if callable(value):
+                try:
+                    value = value()
+                except Exception:
+                    continue
+            values.append((key, value))
+        return values
+
+    def snapshot(self):
+        gauges = self._gauge_values()
+        with self.lock:
+            counters = list(self.counters.items())
+            histograms = [(key, list(h.counts), h.total, h.count) for key, h in self.histograms.items()]
+
+        def label_text(labels):
+            return ",".join(f"{k}={v}" for k, v in labels)
+
+        data = {"uptime_seconds": round(time.time() - self.started, 1),
+                "counters": {}, "gauges": {}, "histograms": {}}
+        for (name, labels), value in counters:
+            data["counters"].setdefault(name, {})[label_text(labels)] = value
+        for (name, labels), value in gauges:
+            data["gauges"].setdefault(name, {})[label_text(labels)] = value
+        for (name, labels), counts, total, count in histograms:
+            data["histograms"].setdefault(name, {})[label_text(labels)] = {
+                "count": count, "sum": round(total, 6), "mean": round(total / count, 6) if count else 0,
+                "buckets": {str(bound): n for bound, n in zip(HISTOGRAM_BUCKETS + ("+Inf",), counts)},
+            }
+        return data
+
+    def render_prometheus(self):
+        gauges = self._gauge_values()
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, list(h.counts), h.total, h.count) for key, h in self.histograms.items())
+
+        def labels_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{labels_text(labels)} {value}")
+        for (name, labels), value in sorted(gauges, key=lambda item: item[0]):
+            declare(name, "gauge")
+            lines.append(f"{name}{labels_text(labels)} {value}")
+        for (name, labels), counts, total, count in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(HISTOGRAM_BUCKETS + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{labels_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{labels_text(labels)} {total}")
+            lines.append(f"{name}_count{labels_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+default_registry = MetricsRegistry()
+
+
+def inc(name, amount=1, **labels):
+    default_registry.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    default_registry.observe(name, value, **labels)
+
+
+def set_gauge(name, value, **labels):
+    default_registry.set_gauge(name, value, **labels)
+
+
+def span(phase):
+    return default_registry.span(phase)
+
+
+# Outcome of one project sync (daemon or one-shot run)
+def record_sync(project_name, status, seconds):
+    default_registry.inc("syncs_total", status=status)
+    default_registry.observe("sync_duration_seconds", seconds)
+    if status == "failed":
+        default_registry.inc("sync_failures_total", project=project_name)
+
+
+# Opt-in cProfile capture of a single sync. arm("name") profiles the next
+# sync of that project ("*" : the next sync of any project), writes the
+# .prof file to PROFILE_DIR and prints the most expensive functions.
+class SyncProfiler:
+
+    def __init__(self, profile_dir=PROFILE_DIR):
+        self.profile_dir = profile_dir
+        self.target = None
+        self.lock = threading.Lock()
+
+    def arm(self, project_name="*"):
+        with self.lock:
+            self.target = project_name
+        print(f"⏱ Next sync of {'any project' if project_name == '*' else project_name} will be profiled.")
+
+    def _take(self, project_name):
+        with self.lock:
+            if self.target is None or self.target not in ("*", project_name):
+                return False
+            self.target = None
+            return True
+
+    @contextmanager
+    def profile(self, project_path):
+        project_name = os.path.basename(project_path)
+        if not self._take(project_name):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{project_name}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+            profiler.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            print(f"⏱ Profile of {project_name} written to {path} (snakeviz / python -m pstats)")
+            print(out.getvalue())
+
+
+default_profiler = SyncProfiler()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry = default_registry
+    profiler = default_profiler
+
+    def _send(self, status, body, content_type):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            self._send(200, self.registry.render_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+        elif path == "/metrics.json":
+            self._send(200, json.dumps(self.registry.snapshot(), indent=2), "application/json")
+        else:
+            self._send(404, "not found\n", "text/plain")
+
+    # POST /profile?project=<nom> : profile la prochaine synchro de ce projet
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/profile":
+            self._send(404, "not found\n", "text/plain")
+            return
+        project_name = parse_qs(url.query).get("project", ["*"])[0]
+        self.profiler.arm(project_name)
+        self._send(202, f"next sync of {project_name} will be profiled\n", "text/plain")
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Local HTTP endpoint: /metrics (Prometheus), /metrics.json, POST /profile
+class MetricsServer:
+
+    def __init__(self, port, host=METRICS_HOST, registry=None, profiler=None):
+        handler = type("MetricsRequestHandler", (_MetricsRequestHandler,), {
+            "registry": registry or default_registry,
+            "profiler": profiler or default_profiler,
+        })
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        print(f"📈 Metrics available at {self.url}/metrics")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+
+# Periodic JSON dump of the metrics (written atomically), for setups
+# without a scraper. The last snapshot is written again on stop().
+class MetricsDumper:
+
+    def __init__(self, path, interval, registry=None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry or default_registry
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def dump(self):
+        try:
+            atomic_write_json(self.path, self.registry.snapshot())
+        except OSError as e:
+            print(f"✗ Could not write metrics to {self.path}: {e}")
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.dump()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.dump()
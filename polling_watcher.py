@@ -0,0 +1,319 @@
+import os
+import threading
+import time
+from watchdog.events import (
+    DirCreatedEvent, DirDeletedEvent, FileCreatedEvent, FileDeletedEvent, FileModifiedEvent
+)
+
+
+POLL_INTERVAL = 1.0                 # secondes entre deux passages
+POLL_BUDGET = 0.1                   # temps de scan maximal par passage (10 % d'un cœur / du disque)
+POLL_MTIME_SLACK_NS = 2 * 10**9     # dossier modifié trop récemment : relu au passage suivant
+
+
+class FileRecord:
+    __slots__ = ("mtime_ns", "size")
+
+    def __init__(self, mtime_ns, size):
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+
+class DirRecord:
+    __slots__ = ("mtime_ns", "racy", "files", "subdirs", "pruned")
+
+    def __init__(self, mtime_ns, files, subdirs, pruned):
+        self.mtime_ns = mtime_ns
+        self.files = files        # name -> FileRecord
+        self.subdirs = subdirs    # names of the non-ignored subdirectories
+        self.pruned = pruned      # ignored subdirectories, never listed
+        # Modifié dans la granularité des horodatages : une nouvelle écriture
+        # pourrait laisser le même mtime
+        self.racy = time.time_ns() - mtime_ns < POLL_MTIME_SLACK_NS
+
+
+# Polling watcher for filesystems where inotify misses events (NFS, SMB,
+# some containers). It keeps a compact snapshot of every non-ignored
+# directory (mtime, file names with their mtime and size) and, on each
+# pass, spends at most `budget` seconds:
+#
+#   1. stat()ing directories in round robin: only a directory whose mtime
+#      changed (entries created, deleted or renamed) is listed again;
+#   2. with the time left, stat()ing the files of the next directories to
+#      catch in-place writes, which do not change the directory mtime.
+#
+# Large trees are therefore covered over several passes instead of being
+# rescanned entirely every interval. Changes are delivered to the handler
+# as watchdog events, like PrunedInotifyWatcher and watchdog's Observer.
+class PollingWatcher:
+
+    def __init__(self, handler, parents, is_ignored, interval=POLL_INTERVAL, budget=POLL_BUDGET):
+        self.handler = handler
+        self.parents = {os.path.abspath(parent) for parent in parents}
+        self.is_ignored = is_ignored
+        self.interval = interval
+        self.budget = budget
+
+        self.parent_records = {}   # parent -> DirRecord (projects as subdirs)
+        self.dirs = {}             # directory inside a project -> DirRecord
+        self.order = None          # round-robin order of self.dirs, rebuilt when it changes
+        self.dir_cursor = 0
+        self.file_cursor = 0
+        self.dir_cycle_start = time.monotonic()
+        self.sweep_start = time.monotonic()
+        self.last_dir_cycle = None
+        self.last_sweep = None
+        self.events_delivered = 0
+        self.rescans = set()   # projects whose ignore rules changed
+        self.rescans_lock = threading.Lock()
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="polling-watcher", daemon=True)
+
+    # --- snapshot ----------------------------------------------------------
+
+    def _list(self, path, projects_only=False):
+        mtime_ns = os.stat(path).st_mtime_ns   # avant la lecture : un ajout pendant le scan sera revu
+        files, subdirs, pruned = {}, set(), 0
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if projects_only:
+                            if not entry.name.startswith('.'):
+                                subdirs.add(entry.name)
+                        elif self.is_ignored(entry.path, True):
+                            pruned += 1
+                        else:
+                            subdirs.add(entry.name)
+                    elif not projects_only and not self.is_ignored(entry.path, False):
+                        st = entry.stat(follow_symlinks=False)
+                        files[entry.name] = FileRecord(st.st_mtime_ns, st.st_size)
+                except OSError:
+                    continue
+        return DirRecord(mtime_ns, files, subdirs, pruned)
+
+    # Snapshot a directory tree. With emit=True its files are reported as
+    # created (a new project or a folder moved into a project).
+    def _add_tree(self, root, emit=False):
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                record = self._list(directory)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+            self.dirs[directory] = record
+            self.order = None
+            for name in record.subdirs:
+                path = os.path.join(directory, name)
+                pending.append(path)
+                if emit:
+                    self._deliver(DirCreatedEvent(path))
+            if emit:
+                for name in record.files:
+                    self._deliver(FileCreatedEvent(os.path.join(directory, name)))
+
+    def _remove_tree(self, root, emit=True):
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            record = self.dirs.pop(directory, None)
+            if record is None:
+                continue
+            self.order = None
+            pending.extend(os.path.join(directory, name) for name in record.subdirs)
+            if emit:
+                for name in record.files:
+                    self._deliver(FileDeletedEvent(os.path.join(directory, name)))
+        if emit:
+            self._deliver(DirDeletedEvent(root))
+
+    # Compare a directory with its snapshot after its mtime changed
+    def _rescan_dir(self, directory, old):
+        try:
+            new = self._list(directory)
+        except (FileNotFoundError, NotADirectoryError):
+            return   # le dossier parent constatera la suppression
+        except PermissionError:
+            return
+        self.dirs[directory] = new
+
+        for name, file_record in new.files.items():
+            previous = old.files.get(name)
+            if previous is None:
+                self._deliver(FileCreatedEvent(os.path.join(directory, name)))
+            elif previous.mtime_ns != file_record.mtime_ns or previous.size != file_record.size:
+                self._deliver(FileModifiedEvent(os.path.join(directory, name)))
+        for name in old.files.keys() - new.files.keys():
+            self._deliver(FileDeletedEvent(os.path.join(directory, name)))
+
+        for name in old.subdirs - new.subdirs:
+            self._remove_tree(os.path.join(directory, name))
+        for name in new.subdirs - old.subdirs:
+            path = os.path.join(directory, name)
+            self._deliver(DirCreatedEvent(path))
+            self._add_tree(path, emit=True)
+
+    def _check_dir(self, directory, record):
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return
+        if mtime_ns != record.mtime_ns or record.racy:
+            self._rescan_dir(directory, record)
+
+    # In-place writes: stat the files of one directory
+    def _sweep_dir(self, directory, record):
+        for name, file_record in record.files.items():
+            try:
+                st = os.stat(os.path.join(directory, name), follow_symlinks=False)
+            except OSError:
+                continue   # supprimé : relevé par le mtime du dossier
+            if st.st_mtime_ns != file_record.mtime_ns or st.st_size != file_record.size:
+                file_record.mtime_ns = st.st_mtime_ns
+                file_record.size = st.st_size
+                self._deliver(FileModifiedEvent(os.path.join(directory, name)))
+
+    # New or removed projects directly under a parent directory
+    def _check_parents(self):
+        for parent in self.parents:
+            old = self.parent_records.get(parent)
+            try:
+                if old is not None and not old.racy and os.stat(parent).st_mtime_ns == old.mtime_ns:
+                    continue
+                new = self._list(parent, projects_only=True)
+            except (FileNotFoundError, PermissionError):
+                continue
+            self.parent_records[parent] = new
+            if old is None:
+                continue
+            for name in old.subdirs - new.subdirs:
+                self._remove_tree(os.path.join(parent, name), emit=False)
+            for name in new.subdirs - old.subdirs:
+                self._add_tree(os.path.join(parent, name), emit=True)
+
+    # Bring the snapshot of a project back in line with its ignore rules:
+    # every folder is listed again, records of folders ignored now are
+    # dropped and folders no longer ignored are snapshotted. No events are
+    # delivered, the caller schedules a full sync of the project.
+    def _reprune(self, root):
+        prefix = root + os.sep
+        for directory in [path for path in self.dirs if path == root or path.startswith(prefix)]:
+            old = self.dirs.get(directory)
+            if old is None:
+                continue
+            try:
+                new = self._list(directory)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+            self.dirs[directory] = new
+            for name in old.subdirs - new.subdirs:
+                self._remove_tree(os.path.join(directory, name), emit=False)
+            for name in new.subdirs - old.subdirs:
+                self._add_tree(os.path.join(directory, name))
+
+    # Called from any thread; applied at the start of the next pass
+    def request_rescan(self, project_path):
+        with self.rescans_lock:
+            self.rescans.add(os.path.abspath(project_path))
+
+    def _apply_rescans(self):
+        with self.rescans_lock:
+            rescans, self.rescans = self.rescans, set()
+        for project_path in rescans:
+            self._reprune(project_path)
+
+    # --- polling loop -----------------------------------------------------
+
+    def _deliver(self, event):
+        self.events_delivered += 1
+        self.handler.dispatch(event)
+
+    def _poll(self):
+        deadline = time.perf_counter() + self.budget
+        self._apply_rescans()
+        self._check_parents()
+        if self.order is None:
+            self.order = list(self.dirs)
+        order = self.order
+        count = len(order)
+
+        # Au plus un tour complet de chaque sorte par passage
+        for _ in range(count):
+            if time.perf_counter() >= deadline:
+                return
+            directory = order[self.dir_cursor % count]
+            self.dir_cursor = (self.dir_cursor + 1) % count
+            record = self.dirs.get(directory)
+            if record is not None:
+                self._check_dir(directory, record)
+            if self.dir_cursor == 0:
+                now = time.monotonic()
+                self.last_dir_cycle = now - self.dir_cycle_start
+                self.dir_cycle_start = now
+
+        for _ in range(count):
+            if time.perf_counter() >= deadline:
+                return
+            directory = order[self.file_cursor % count]
+            self.file_cursor = (self.file_cursor + 1) % count
+            record = self.dirs.get(directory)
+            if record is not None:
+                self._sweep_dir(directory, record)
+            if self.file_cursor == 0:
+                now = time.monotonic()
+                self.last_sweep = now - self.sweep_start
+                self.sweep_start = now
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            start = time.monotonic()
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"✗ Error while polling for changes: {e}")
+            self.stop_event.wait(max(0.0, self.interval - (time.monotonic() - start)))
+
+    def stats(self):
+        return {
+            "directories": len(self.dirs),
+            "files": sum(len(record.files) for record in list(self.dirs.values())),
+            "pruned_dirs": sum(record.pruned for record in list(self.dirs.values())),
+            "events_delivered": self.events_delivered,
+            "dir_cycle_seconds": self.last_dir_cycle,
+            "file_sweep_seconds": self.last_sweep,
+        }
+
+    def report(self):
+        stats = self.stats()
+
+        def seconds(value):
+            return "pending" if value is None else f"{value:.1f}s"
+
+        print(f"👁 Polling {stats['directories']} folders / {stats['files']} files, "
+              f"{stats['pruned_dirs']} ignored folders pruned, {stats['events_delivered']} events delivered "
+              f"(folder cycle {seconds(stats['dir_cycle_seconds'])}, file sweep {seconds(stats['file_sweep_seconds'])}).")
+
+    # --- Observer-like interface -------------------------------------------
+
+    def start(self):
+        for parent in sorted(self.parents):
+            try:
+                record = self._list(parent, projects_only=True)
+            except (FileNotFoundError, PermissionError) as e:
+                print(f"Cannot watch {parent}: {e}")
+                continue
+            self.parent_records[parent] = record
+            for name in record.subdirs:
+                self._add_tree(os.path.join(parent, name))
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def is_alive(self):
+        return self.thread.is_alive()
@@ -0,0 +1,86 @@
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:   # Windows : verrou limité au processus courant
+    fcntl = None
+
+
+LOCK_DIR = ".sync_locks"
+LOCK_POLL_INTERVAL = 0.1
+
+
+class ProjectLockBusy(Exception):
+    pass
+
+
+# Per-project locks: a threading.Lock for the threads of this process plus
+# an advisory flock() on <lock_dir>/<hash of the path>.lock, so the watcher
+# and a cron run of sync_script.py never work on the same repository at the
+# same time. Lock files are left in place: deleting them would let two
+# processes lock two different files for the same project.
+class ProjectLocks:
+
+    def __init__(self, lock_dir=LOCK_DIR):
+        self.lock_dir = lock_dir
+        self.locks = {}   # project_path -> threading.Lock
+        self.registry_lock = threading.Lock()
+
+    def _thread_lock(self, project_path):
+        with self.registry_lock:
+            lock = self.locks.get(project_path)
+            if lock is None:
+                lock = self.locks[project_path] = threading.Lock()
+            return lock
+
+    def lock_path(self, project_path):
+        digest = hashlib.sha1(project_path.encode("utf-8", "surrogateescape")).hexdigest()[:16]
+        return os.path.join(self.lock_dir, f"{os.path.basename(project_path)}-{digest}.lock")
+
+    def _lock_file(self, project_path, deadline):
+        os.makedirs(self.lock_dir, exist_ok=True)
+        f = open(self.lock_path(project_path), "a+")
+        while True:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    f.close()
+                    return None
+                time.sleep(LOCK_POLL_INTERVAL)
+
+        # Pour le diagnostic : qui détient le verrou
+        f.seek(0)
+        f.truncate()
+        f.write(f"{os.getpid()} {project_path}\n")
+        f.flush()
+        return f
+
+    # Hold the project lock, waiting at most `timeout` seconds. Raises
+    # ProjectLockBusy when another thread or process still holds it.
+    @contextmanager
+    def hold(self, project_path, timeout=0):
+        project_path = os.path.abspath(project_path)
+        deadline = time.monotonic() + timeout
+        thread_lock = self._thread_lock(project_path)
+        acquired = thread_lock.acquire(timeout=timeout) if timeout > 0 else thread_lock.acquire(blocking=False)
+        if not acquired:
+            raise ProjectLockBusy(project_path)
+
+        lock_file = None
+        try:
+            if fcntl is not None:
+                lock_file = self._lock_file(project_path, deadline)
+                if lock_file is None:
+                    raise ProjectLockBusy(project_path)
+            yield
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                lock_file.close()
+            thread_lock.release()
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from git import Repo
+
+
+REPO_POOL_SIZE = 32
+REPO_IDLE_TIMEOUT = 300   # secondes sans utilisation avant fermeture d'un Repo
+
+
+def git_dir_inode(repo):
+    try:
+        return os.stat(repo.git_dir).st_ino
+    except OSError:
+        return None
+
+
+# Bounded LRU pool of Repo handles keyed by project path. A handle keeps its
+# persistent `git cat-file` processes between syncs instead of starting new
+# ones for every Repo(). Handles beyond the capacity, or unused for
+# idle_timeout seconds, are closed (which stops their git processes).
+#
+# A project being synced is leased: its handle is never closed while the
+# lease is held, even if it is the least recently used one.
+class RepoPool:
+
+    def __init__(self, capacity=REPO_POOL_SIZE, idle_timeout=REPO_IDLE_TIMEOUT):
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.handles = OrderedDict()   # project_path -> (repo, last_used, inode of .git)
+        self.leases = {}               # project_path -> lease count
+        self.lock = threading.Lock()
+
+    # Cached handle of a project, opened on first use. Raises
+    # InvalidGitRepositoryError / NoSuchPathError like Repo().
+    def get(self, project_path):
+        project_path = os.path.abspath(project_path)
+        with self.lock:
+            cached = self.handles.get(project_path)
+            if cached is not None and git_dir_inode(cached[0]) == cached[2]:
+                self.handles[project_path] = (cached[0], time.monotonic(), cached[2])
+                self.handles.move_to_end(project_path)
+                return cached[0]
+
+        # .git supprimé ou recréé : l'ancien handle n'est plus utilisable
+        if cached is not None:
+            self.discard(project_path)
+
+        repo = Repo(project_path)
+        return self.add(project_path, repo)
+
+    # Put a handle created elsewhere (e.g. by Repo.init) in the pool
+    def add(self, project_path, repo):
+        project_path = os.path.abspath(project_path)
+        with self.lock:
+            previous = self.handles.pop(project_path, None)
+            self.handles[project_path] = (repo, time.monotonic(), git_dir_inode(repo))
+            evicted = self._select_evictions()
+        if previous is not None and previous[0] is not repo:
+            evicted.append(previous[0])
+        self._close_all(evicted)
+        return repo
+
+    def discard(self, project_path):
+        with self.lock:
+            cached = self.handles.pop(os.path.abspath(project_path), None)
+        if cached is not None:
+            self._close_all([cached[0]])
+
+    @contextmanager
+    def lease(self, project_path):
+        project_path = os.path.abspath(project_path)
+        with self.lock:
+            self.leases[project_path] = self.leases.get(project_path, 0) + 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.leases[project_path] -= 1
+                if not self.leases[project_path]:
+                    del self.leases[project_path]
+                evicted = self._select_evictions()
+            self._close_all(evicted)
+
+    # Handles to close: least recently used beyond the capacity, then idle
+    # ones. Leased projects are kept. Called with the lock held.
+    def _select_evictions(self):
+        now = time.monotonic()
+        excess = len(self.handles) - self.capacity
+        evicted = []
+        for project_path, (repo, last_used, _) in list(self.handles.items()):
+            if project_path in self.leases:
+                continue
+            if excess > 0 or now - last_used > self.idle_timeout:
+                del self.handles[project_path]
+                evicted.append(repo)
+                excess -= 1
+        return evicted
+
+    def evict_idle(self):
+        with self.lock:
+            evicted = self._select_evictions()
+        self._close_all(evicted)
+        return len(evicted)
+
+    @staticmethod
+    def _close_all(repos):
+        for repo in repos:
+            try:
+                repo.close()
+            except Exception:
+                pass
+
+    def close(self):
+        with self.lock:
+            repos = [cached[0] for cached in self.handles.values()]
+            self.handles.clear()
+        self._close_all(repos)
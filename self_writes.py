@@ -0,0 +1,68 @@
+import hashlib
+import os
+import threading
+import time
+
+
+SELF_WRITE_TTL = 60                    # secondes pendant lesquelles une écriture est reconnue
+SELF_WRITE_HASH_LIMIT = 8 * 1024 * 1024  # au-delà, taille + mtime au lieu du contenu
+
+
+# Content signature of a file: sha1 of its content (size and mtime for big
+# files), None when the file does not exist
+def content_signature(path):
+    try:
+        st = os.stat(path)
+        if st.st_size > SELF_WRITE_HASH_LIMIT:
+            return f"{st.st_size}:{st.st_mtime_ns}"
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError, PermissionError):
+        return None
+
+
+# Files written (or deleted) by the sync engine itself, with the content it
+# left behind. An event on such a path is the daemon's own echo as long as
+# the file still has that content; a later edit by the user changes the
+# signature and goes through.
+class SelfWriteRegistry:
+
+    def __init__(self, ttl=SELF_WRITE_TTL):
+        self.ttl = ttl
+        self.entries = {}   # absolute path -> (signature, expires)
+        self.lock = threading.Lock()
+
+    def record(self, paths):
+        signatures = [(os.path.abspath(path), content_signature(path)) for path in paths]
+        expires = time.monotonic() + self.ttl
+        with self.lock:
+            self._purge()
+            for path, signature in signatures:
+                self.entries[path] = (signature, expires)
+
+    def _purge(self):
+        now = time.monotonic()
+        for path in [path for path, (_, expires) in self.entries.items() if expires < now]:
+            del self.entries[path]
+
+    def matches(self, path):
+        if not self.entries:
+            return False
+        path = os.path.abspath(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None:
+                # Dossier vidé puis supprimé par git après ses fichiers
+                prefix = path + os.sep
+                return not os.path.exists(path) and any(
+                    signature is None and other.startswith(prefix)
+                    for other, (signature, _) in self.entries.items()
+                )
+            if entry[1] < time.monotonic():
+                del self.entries[path]
+                return False
+
+        return content_signature(path) == entry[0]
@@ -0,0 +1,143 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+
+# Write a file atomically: temp file in the same directory, fsync, rename
+def atomic_write_json(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_json(path):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+# Legacy backend: the whole state lives in one JSON file, rewritten atomically.
+class JsonStateStore:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def load_all(self):
+        with self.lock:
+            return read_json(self.path)
+
+    def update(self, project_path, fields):
+        with self.lock:
+            state = read_json(self.path)
+            entry = state.get(project_path)
+            entry = dict(entry) if isinstance(entry, dict) else {}
+            entry.update(fields)
+            state[project_path] = entry
+            atomic_write_json(self.path, state)
+            return entry
+
+    def close(self):
+        pass
+
+
+# SQLite backend: one row per project, so updating a single project is O(1)
+# and atomic.
+class SqliteStateStore:
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS projects (
+            path TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def is_empty(self):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM projects LIMIT 1").fetchone() is None
+
+    def load_all(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT path, data FROM projects").fetchall()
+        return {path: json.loads(data) for path, data in rows}
+
+    def update(self, project_path, fields):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT data FROM projects WHERE path = ?", (project_path,)).fetchone()
+                entry = json.loads(row[0]) if row else {}
+                entry.update(fields)
+                self.conn.execute(
+                    "INSERT INTO projects (path, data) VALUES (?, ?) "
+                    "ON CONFLICT(path) DO UPDATE SET data = excluded.data",
+                    (project_path, json.dumps(entry))
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return entry
+
+    # Write a whole state (JSON migration), only touching rows whose content
+    # changed. Rows missing from `state` are kept: they may have been added
+    # by another process since `state` was loaded.
+    def save_all(self, state):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = dict(self.conn.execute("SELECT path, data FROM projects").fetchall())
+                for project_path, entry in state.items():
+                    data = json.dumps(entry)
+                    if current.get(project_path) != data:
+                        self.conn.execute(
+                            "INSERT INTO projects (path, data) VALUES (?, ?) "
+                            "ON CONFLICT(path) DO UPDATE SET data = excluded.data",
+                            (project_path, data)
+                        )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+# Open the configured backend. An existing JSON state file is imported into
+# a fresh SQLite database once, then kept aside as <file>.migrated.
+def open_state_store(backend, json_path, sqlite_path):
+    if backend == "json":
+        return JsonStateStore(json_path)
+
+    if backend != "sqlite":
+        raise ValueError(f"Unknown state backend: {backend}")
+
+    store = SqliteStateStore(sqlite_path)
+    if os.path.exists(json_path) and store.is_empty():
+        legacy_state = read_json(json_path)
+        store.save_all(legacy_state)
+        os.replace(json_path, json_path + ".migrated")
+        print(f"Migrated {len(legacy_state)} tracked projects from {json_path} to {sqlite_path}.")
+    return store
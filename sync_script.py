@@ -1,16 +1,67 @@
+import argparse
+import contextlib
 import datetime 
-import os
+import hashlib
 import json
+import random
+import re
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from git import Actor, InvalidGitRepositoryError, Repo, GitCommandError
 from github import Github, GithubException, Auth
+from state_store import open_state_store, atomic_write_json
+from ignore_rules import IgnoreMatcherCache
+from repo_pool import RepoPool
+from project_lock import ProjectLocks, ProjectLockBusy, LOCK_DIR
+from self_writes import SelfWriteRegistry
+from github_catalog import GithubRepoCatalog, authenticated_url, rate_limited
+from metrics import span, record_sync, default_registry, default_profiler
 
 
 
 
 STATE_FILE="tracked_repos.json"
+STATE_DB_FILE = "tracked_repos.db"
+STATE_BACKEND = "sqlite"   # "sqlite" or "json"
 BACKDATE_COMMITS_TO_FOLDER_DATE = False
 PARENT_DIRECTORIES = ["../Projects_test"]
+SYNC_WORKERS = 4
+STATE_FLUSH_DELAY = 2
+FINGERPRINT_SKIP_DIRS = {'.git'}
+FULL_STAGE_INTERVAL = 600   # seconds between two full `git add -A` of a project
+PUSH_RETRIES = 3
+CONFLICT_CHUNK_SIZE = 1024 * 1024
+PUSH_RETRY_BASE_DELAY = 30
+PUSH_RETRY_MAX_DELAY = 3600
+PROJECT_LOCK_TIMEOUT = 30   # attente maximale d'un projet verrouillé par un autre processus
+SQUASH_AUTOSAVES = False    # fusionner les commits automatiques non poussés en un seul
+MAX_FILE_SIZE = 100 * 1024 * 1024   # limite de GitHub par fichier
+LARGE_FILE_POLICY = "exclude"       # "exclude" ou "lfs" (Git LFS, si installé)
+MAINTENANCE_INTERVAL = 24 * 3600
+INCREMENTAL_SCAN = True
+WATERMARK_SLACK_NS = 2 * 10**9   # file timestamps are coarser than time.time_ns()
+
+# Règles au format .gitignore, complétées par le .gitignore de chaque projet
+IGNORE_PATTERNS = [
+    '.git/',
+    '__pycache__/',
+    '*.pyc',
+    '.venv/',
+    'venv/',
+    '.env',
+    'node_modules/',
+    '.DS_Store',
+    'tracked_repos.json',
+    'tracked_repos.db*',
+    f'{LOCK_DIR}/'
+]
 
 
 # Load configuration from .env file
@@ -25,18 +76,98 @@ def load_config():
     return token, username, email
 
 
-# Load tracking state from JSON file
+_state_store = None
+_state_store_lock = threading.Lock()
+
+
+# Shared state backend, opened (and migrated from JSON) on first use
+def get_state_store():
+    global _state_store
+    with _state_store_lock:
+        if _state_store is None:
+            _state_store = open_state_store(STATE_BACKEND, STATE_FILE, STATE_DB_FILE)
+        return _state_store
+
+
+# Load tracking state from the state backend
 def load_state():
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+    return get_state_store().load_all()
+
+
+# Save the fields of one project that changed. Only these fields are
+# written, so a concurrent process (watcher and cron run) never loses the
+# projects or fields the other one updated in the meantime.
+def save_project_state(project_path, fields):
+    with span("state_save"):
+        return get_state_store().update(project_path, fields)
+
+
+# GitHub client; GITHUB_API_URL points it to another API (e.g. fake_github.py)
+def make_github_client(token, pool_size=None):
+    base_url = os.getenv("GITHUB_API_URL") or "https://api.github.com"
+    return Github(auth=Auth.Token(token), base_url=base_url, per_page=100, pool_size=pool_size)
 
 
-# Save tracking state to JSON file
-def save_state(state):
-    with open(STATE_FILE, 'w') as f:
-        json.dump(state, f, indent=4)
+# Long-lived context for the daemon: config, GitHub client and state are loaded
+# once and shared by every sync. State writes are coalesced into one save
+# of the changed fields.
+class SyncContext:
+
+    def __init__(self, flush_delay=STATE_FLUSH_DELAY, pool_size=SYNC_WORKERS):
+        self.token, self.username, self.email = load_config()
+        self.github_client = make_github_client(self.token, pool_size=pool_size)
+        self.catalog = GithubRepoCatalog(self.github_client)
+        self.state = load_state()
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.flush_delay = flush_delay
+        self.flush_timer = None
+        self.dirty_fields = {}   # project_path -> fields changed since the last flush
+
+    def is_tracked(self, project_path):
+        with self.lock:
+            return isinstance(self.state.get(project_path), dict)
+
+    def get_project(self, project_path):
+        with self.lock:
+            entry = self.state.get(project_path)
+            return dict(entry) if isinstance(entry, dict) else None
+
+    def update_project(self, project_path, **fields):
+        with self.lock:
+            entry = self.state.get(project_path)
+            if isinstance(entry, dict):
+                entry.update(fields)
+            else:
+                self.state[project_path] = dict(fields)
+        self.mark_dirty(project_path, fields)
+
+    # Plusieurs mises à jour rapprochées ne donnent lieu qu'à une seule écriture
+    def mark_dirty(self, project_path, fields):
+        with self.lock:
+            self.dirty_fields.setdefault(project_path, {}).update(fields)
+            if self.flush_timer is None:
+                self.flush_timer = threading.Timer(self.flush_delay, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                self.flush_timer = None
+                dirty_fields, self.dirty_fields = self.dirty_fields, {}
+
+            # Seuls les champs modifiés sont réécrits : une exécution de
+            # sync_script.py a pu mettre à jour les autres entre-temps
+            for project_path, fields in dirty_fields.items():
+                save_project_state(project_path, fields)
+
+    def close(self):
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+        self.flush()
+        self.github_client.close()
 
 
 # Get the commit date for a folder mtime or current date
@@ -49,33 +180,255 @@ def get_commit_date(folder_path):
     return datetime.datetime.now(tz=datetime.timezone.utc)
 
 
-# Check if there are uncommited changes in the repo
+# Check if there are uncommited changes in the repo. A file kept out of git
+# by the large-file guard and now small enough counts as a change: git
+# status does not show it while it is listed in .git/info/exclude.
 def has_uncommited_changes(repo):
-    return repo.is_dirty(untracked_files=True)
+    return repo.is_dirty(untracked_files=True) or has_releasable_large_files(repo)
+
+
+LARGE_FILES_BEGIN = "# >>> sync_script: files over MAX_FILE_SIZE"
+LARGE_FILES_END = "# <<< sync_script"
+
+# Le bloc des fichiers volumineux de .git/info/exclude n'est pas lu par les
+# filtres : un fichier exclu redevenu assez petit doit rester visible
+_ignore_matchers = IgnoreMatcherCache(IGNORE_PATTERNS, skip_block=(LARGE_FILES_BEGIN, LARGE_FILES_END))
+_scan_matchers = IgnoreMatcherCache([], skip_block=(LARGE_FILES_BEGIN, LARGE_FILES_END))
+
+
+# Compiled ignore matcher of a project (IGNORE_PATTERNS + its .gitignore)
+def get_ignore_matcher(project_path, revalidate=False):
+    return _ignore_matchers.get(project_path, revalidate)
+
+
+# Matcher with git's own rules only (.gitignore + .git/info/exclude), used
+# by the fingerprint and the watermark: a path `git add -A` would commit
+# must never be skipped by them, even if the watcher ignores its events
+def get_scan_matcher(project_path):
+    return _scan_matchers.get(project_path, revalidate=True)
+
+
+_repo_pool = RepoPool()
+
+
+# Shared Repo handle of a project (see repo_pool.py): reused between syncs
+# so its persistent git processes are not restarted every time
+def get_repo(project_path):
+    return _repo_pool.get(project_path)
+
+
+# Keep the project's Repo handle open for the duration of a sync
+def lease_repo(project_path):
+    return _repo_pool.lease(project_path)
+
+
+def evict_idle_repos():
+    return _repo_pool.evict_idle()
+
+
+def close_repos():
+    _repo_pool.close()
+
+
+_project_locks = ProjectLocks(LOCK_DIR)
+
+
+_self_writes = SelfWriteRegistry()
+
 
+# Remember files written or deleted by the sync engine (.gitignore, conflict
+# copies, merged files), so the watcher does not sync its own writes again
+def record_self_writes(paths):
+    _self_writes.record(paths)
+
+
+def is_self_write(path):
+    return _self_writes.matches(path)
+
+
+# Record the work tree files changed between two commits (e.g. by a pull)
+def record_tree_update(repo, folder_path, old_head):
+    try:
+        new_head = repo.head.commit.hexsha
+        if not old_head or new_head == old_head:
+            return
+        changed = repo.git.diff("--name-only", "-z", "--no-renames", old_head, new_head)
+    except (GitCommandError, ValueError):
+        return
+    record_self_writes(os.path.join(folder_path, path) for path in changed.split("\0") if path)
+
+
+# Exclusive access to a project for one sync, shared between threads and
+# processes (watcher and cron run). Raises ProjectLockBusy after `timeout`.
+def project_lock(project_path, timeout=0):
+    return _project_locks.hold(project_path, timeout)
+
+
+# Build the per-project file index: relative path -> [size, mtime_ns, inode].
+# Only stat data is read, no file content and no git process. With rel_root
+# only that folder of the project is indexed.
+def build_file_index(project_path, matcher=None, rel_root=""):
+    index = {}
+    pending_dirs = [rel_root]
+
+    while pending_dirs:
+        rel_dir = pending_dirs.pop()
+        try:
+            with os.scandir(os.path.join(project_path, rel_dir)) as entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    # Fichier supprimé entre la lecture du dossier et son stat : on passe au suivant
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in FINGERPRINT_SKIP_DIRS and \
+                                    not (matcher and matcher.match(rel_path, is_dir=True)):
+                                pending_dirs.append(rel_path)
+                            continue
+                        if matcher and matcher.match(rel_path):
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    index[rel_path] = [st.st_size, st.st_mtime_ns, st.st_ino]
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+
+    return index
+
+
+# Digest of a file index, compared with the one stored at the last sync
+def fingerprint_index(index):
+    digest = hashlib.sha1()
+    for rel_path in sorted(index):
+        size, mtime_ns, inode = index[rel_path]
+        digest.update(f"{rel_path}\0{size}\0{mtime_ns}\0{inode}\n".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()
+
+
+# State fields recorded after a successful check: only the fingerprint of
+# the index is kept, the index itself is rebuilt on each check
+def file_index_fields(index):
+    return {"fingerprint": fingerprint_index(index)}
+
+
+# True as soon as a non-ignored file or folder of the project has an mtime
+# or ctime newer than since_ns. Deletions and renames are seen through the
+# mtime of the parent folder, so no file list has to be kept.
+def tree_changed_since(project_path, since_ns, matcher=None):
+    try:
+        st = os.stat(project_path)
+    except OSError:
+        return True
+    if max(st.st_mtime_ns, st.st_ctime_ns) > since_ns:
+        return True
+
+    pending_dirs = [""]
+    while pending_dirs:
+        rel_dir = pending_dirs.pop()
+        try:
+            with os.scandir(os.path.join(project_path, rel_dir)) as entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if is_dir and entry.name in FINGERPRINT_SKIP_DIRS:
+                        continue
+                    if matcher and matcher.match(rel_path, is_dir=is_dir):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                    if max(st.st_mtime_ns, st.st_ctime_ns) > since_ns:
+                        return True
+                    if is_dir:
+                        pending_dirs.append(rel_path)
+        except (FileNotFoundError, NotADirectoryError):
+            return True
+        except PermissionError:
+            continue
+
+    return False
+
+
+# Commit of a ref (loose or packed), read from .git without starting git
+def read_ref(git_dir, ref):
+    try:
+        ref_path = os.path.join(git_dir, *ref.split("/"))
+        if os.path.exists(ref_path):
+            with open(ref_path) as f:
+                return f.read().strip()
+        with open(os.path.join(git_dir, "packed-refs")) as f:
+            for line in f:
+                sha, _, name = line.strip().partition(" ")
+                if name == ref:
+                    return sha
+    except OSError:
+        pass
+    return None
+
+
+# Target of .git/HEAD: "ref: refs/heads/<branch>" or a commit (detached)
+def read_head(project_path):
+    try:
+        with open(os.path.join(project_path, ".git", "HEAD")) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+# Commit pointed to by HEAD, read from .git without starting git
+def read_head_commit(project_path):
+    head = read_head(project_path)
+    if head is None or not head.startswith("ref: "):
+        return head
+    return read_ref(os.path.join(project_path, ".git"), head[5:])
+
+
+# Watermark stored after a successful check: the time the check started
+# (minus a small slack) and the HEAD commit at that point
+def scan_watermark_fields(project_path, started_ns):
+    return {"scan_watermark": {"since_ns": started_ns - WATERMARK_SLACK_NS, "head": read_head_commit(project_path)}}
+
+
+# True when nothing changed in the project since its watermark: same HEAD
+# and no file or folder touched since then
+def unchanged_since_watermark(project_path, entry, matcher=None):
+    watermark = entry.get("scan_watermark")
+    if not watermark or read_head_commit(project_path) != watermark.get("head"):
+        return False
+    return not tree_changed_since(project_path, watermark["since_ns"], matcher)
+
+
+# Create a GitHub repository or return existing one. With a catalog,
+# existing repositories are resolved locally without any API call.
+def create_github_repo(repo_name, is_private, description, github_client, username, catalog=None):
+    if catalog is not None:
+        try:
+            clone_url = catalog.lookup(repo_name)
+        except GithubException as e:
+            print(f"Could not list GitHub repositories: {e}")
+            clone_url = None
+        if clone_url:
+            print(f"Repository {repo_name} already exists on GitHub.")
+            return authenticated_url(clone_url)
 
-# Create a GitHub repository or return existing one
-def create_github_repo(repo_name, is_private, description, github_client, username):
     try:
         user = github_client.get_user()
-        repo = user.create_repo(
+        repo = rate_limited(github_client, lambda: user.create_repo(
             name=repo_name,
             private=is_private,
             description=description or f"Project: {repo_name}",
             auto_init=False 
-        )
-        token = os.getenv("GITHUB_API_TOKEN")
-        auth_url = repo.clone_url.replace("https://", f"https://{token}@")
-        return auth_url
+        ))
+        if catalog is not None:
+            catalog.add(repo.name, repo.clone_url)
+        return authenticated_url(repo.clone_url)
     except GithubException as e:
         if e.status == 422:
             print(f"Repository {repo_name} already exists on GitHub.")
             try:
-                repo = user.get_repo(repo_name)
+                repo = rate_limited(github_client, lambda: user.get_repo(repo_name))
                 print(f"Using existing repository {repo.html_url}.")
-                token = os.getenv("GITHUB_API_TOKEN")
-                auth_url = repo.clone_url.replace("https://", f"https://{token}@")
-                return auth_url 
+                if catalog is not None:
+                    catalog.add(repo.name, repo.clone_url)
+                return authenticated_url(repo.clone_url)
             except GithubException:
                 print(f"Failed to access existing repository {repo_name}.")
                 return None
@@ -91,43 +444,96 @@ def ensure_gitignore(folder_path):
     if not os.path.exists(gitignore_path):
         with open(gitignore_path, 'w') as f:
             f.write("# Auto-generated .gitignore")
+        record_self_writes([gitignore_path])
         return True
     else:
         print(f".gitignore already exists in {folder_path}.")
         return True
     
 
+# Unmerged index entries as {path: {stage: blob_sha}}, from one `git ls-files -u`
+def list_unmerged_entries(repo):
+    entries = {}
+    output = repo.git.ls_files('-u', '-z', strip_newline_in_stdout=False)
+    for record in output.split('\0'):
+        if not record:
+            continue
+        info, file_path = record.split('\t', 1)
+        _mode, sha, stage = info.split()
+        entries.setdefault(file_path, {})[int(stage)] = sha
+    return entries
+
+
+# Stream a blob from git's persistent `cat-file --batch` process to a file,
+# as raw bytes and in chunks
+def write_blob_to_file(repo, sha, target_path):
+    _hexsha, _typename, _size, stream = repo.git.stream_object_data(sha)
+    with open(target_path, "wb") as f:
+        while True:
+            chunk = stream.read(CONFLICT_CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+
+
+# Run one git command on many paths through a NUL-separated pathspec file
+# (no command line length limit, paths taken literally)
+def run_git_on_paths(repo, command, args, paths):
+    if not paths:
+        return
+    fd, pathspec_file = tempfile.mkstemp(prefix="sync-pathspec-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"\0".join(os.fsencode(path) for path in paths))
+        getattr(repo.git, command)(
+            *args, f"--pathspec-from-file={pathspec_file}", "--pathspec-file-nul",
+            env={"GIT_LITERAL_PATHSPECS": "1"}
+        )
+    finally:
+        os.remove(pathspec_file)
+
+
 def handle_conflict_rename_local(repo, folder_path):
-    if not repo.index.unmerged_blobs():
+    unmerged_entries = list_unmerged_entries(repo)
+    if not unmerged_entries:
         print("Aucun conflit détecté dans l'index.")
         return False
 
     print(f"⚠ Conflits détectés dans {folder_path}. Résolution en cours...")
 
     try:
-        unmerged_blobs = repo.index.unmerged_blobs()
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        keep_remote = []     # chemins pour lesquels la version distante existe
+        removed_remote = []  # chemins supprimés côté distant
+        local_copies = []
 
-        for file_path in unmerged_blobs:
-            base, ext = os.path.splitext(file_path)
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            local_renamed_path = f"{base}_local_{timestamp}{ext}"
+        for file_path, stages in unmerged_entries.items():
+            # Sauvegarde de la version locale (stage 2), si elle existe
+            if 2 in stages:
+                base, ext = os.path.splitext(file_path)
+                local_renamed_path = f"{base}_local_{timestamp}{ext}"
+                try:
+                    write_blob_to_file(repo, stages[2], os.path.join(folder_path, local_renamed_path))
+                    local_copies.append(local_renamed_path)
+                    print(f"   -> Version locale sauvegardée sous : {local_renamed_path}")
+                except Exception as e:
+                    print(f"   ! Erreur sauvegarde locale {file_path}: {e}")
+                    continue
 
-            try:
-                content_local = repo.git.show(f":2:{file_path}")
-                full_local_path = os.path.join(folder_path, local_renamed_path)
-                with open(full_local_path, "w", encoding="utf-8") as f:
-                    f.write(content_local)
-                print(f"   -> Version locale sauvegardée sous : {local_renamed_path}")
-            except Exception as e:
-                print(f"   ! Erreur sauvegarde locale {file_path}: {e}")
-                continue
+            if 3 in stages:
+                keep_remote.append(file_path)
+            else:
+                removed_remote.append(file_path)
 
-            repo.git.checkout("--theirs", file_path)
+        # Version distante acceptée, puis une seule mise à jour de l'index
+        run_git_on_paths(repo, "checkout", ["--theirs"], keep_remote)
+        for file_path in keep_remote:
             print(f"   -> Version distante acceptée pour : {file_path}")
-
-            repo.git.add(file_path)
-            repo.git.add(local_renamed_path)
-
+        run_git_on_paths(repo, "rm", ["-q", "--ignore-unmatch"], removed_remote)
+        for file_path in removed_remote:
+            print(f"   -> Suppression distante acceptée pour : {file_path}")
+        run_git_on_paths(repo, "add", [], keep_remote + local_copies)
+        record_self_writes(os.path.join(folder_path, path) for path in keep_remote + removed_remote + local_copies)
 
         commit_msg = "Auto-resolve: Rename local conflicts and keep remote version"
         repo.git.commit("-m", commit_msg)
@@ -140,10 +546,9 @@ def handle_conflict_rename_local(repo, folder_path):
         return False
     
 
-
 def pull_updates(folder_path):
     try:
-        repo = Repo(folder_path)
+        repo = get_repo(folder_path)
         
         if 'origin' not in repo.remotes:
             print(f"No remote 'origin' found for {folder_path}.")
@@ -175,7 +580,8 @@ def pull_updates(folder_path):
         err_msg = str(e)
         if "CONFLICT" in err_msg or "Merge conflict" in err_msg:
             print(f"⚠ Conflict detected during pull in {folder_path}.")
-            return handle_conflict_rename_local(repo, folder_path)
+            with span("conflict"):
+                return handle_conflict_rename_local(repo, folder_path)
         
         elif "MERGE_HEAD exists" in err_msg:
              print(f"⚠ Still stuck in merge state. Attempting force abort...")
@@ -197,11 +603,11 @@ def pull_updates(folder_path):
 # Initialize local Git repository and set remote
 def initialize_local_repo(folder_path, repo_url):
     try:
-        repo = Repo(folder_path)
+        repo = get_repo(folder_path)
         print(f"Existing Git repository found in {folder_path}.")
     except InvalidGitRepositoryError:
         print(f"Initializing new Git repository in {folder_path}.")
-        repo = Repo.init(folder_path)
+        repo = _repo_pool.add(folder_path, Repo.init(folder_path))
 
     if not ensure_gitignore(folder_path):
         return False
@@ -219,7 +625,8 @@ def initialize_local_repo(folder_path, repo_url):
         origin = repo.create_remote('origin', repo_url)
         print(f"Set remote 'origin' to {repo_url}.")
 
-    repo.git.add(A=True)
+    with span("add"):
+        stage_changes(repo, folder_path)
 
     if repo.is_dirty() or repo.untracked_files:
         commit_date = get_commit_date(folder_path)
@@ -229,20 +636,21 @@ def initialize_local_repo(folder_path, repo_url):
 
         author = Actor(author_name, author_email)
 
-        if commit_date:
-            repo.index.commit(
-                "Initial commit",
-                author=author,
-                committer=author,
-                author_date=commit_date,
-                commit_date=commit_date
-            )
-        else:
-            repo.index.commit(
-                "Initial commit",
-                author=author,
-                committer=author
-            )
+        with span("commit"):
+            if commit_date:
+                repo.index.commit(
+                    "Initial commit",
+                    author=author,
+                    committer=author,
+                    author_date=commit_date,
+                    commit_date=commit_date
+                )
+            else:
+                repo.index.commit(
+                    "Initial commit",
+                    author=author,
+                    committer=author
+                )
 
         try:
             current_branch = repo.active_branch.name
@@ -252,7 +660,8 @@ def initialize_local_repo(folder_path, repo_url):
             repo.git.checkout('-B', current_branch)
 
         print("Pushing initial commit to remote repository.")
-        origin.push(refspec=f"{current_branch}:{current_branch}", set_upstream=True)
+        with span("push"):
+            origin.push(refspec=f"{current_branch}:{current_branch}", set_upstream=True)
     else:
         print(f"No changes to commit in {folder_path}.")
 
@@ -260,168 +669,1036 @@ def initialize_local_repo(folder_path, repo_url):
     return True
 
 
-def push_updates(folder_path, commit_message):
-    repo = Repo(folder_path)
+_last_full_stage = {}
 
-    # 1. Ajouter tout à l'index
-    repo.git.add(A=True)
 
-    if not repo.is_dirty() and not repo.untracked_files:
-        print(f"No changes to commit in {folder_path}.")
-        return True
+_lfs_available = None
+
+
+def format_size(size):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+# Anchored gitignore pattern matching exactly one path
+def literal_ignore_pattern(rel_path):
+    escaped = "".join("\\" + c if c in "\\*?[" else c for c in rel_path)
+    if escaped.endswith(" "):
+        escaped = escaped[:-1] + "\\ "
+    return "/" + escaped
+
+
+def ignore_pattern_path(pattern):
+    return re.sub(r"\\(.)", r"\1", pattern[1:])
+
+
+def info_exclude_path(repo):
+    return os.path.join(repo.git_dir, "info", "exclude")
+
+
+# Large files listed in our block of .git/info/exclude, and the other lines
+def read_large_file_excludes(repo):
+    try:
+        with open(info_exclude_path(repo), "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return set(), []
+
+    excluded, others, inside = set(), [], False
+    for line in lines:
+        if line == LARGE_FILES_BEGIN:
+            inside = True
+        elif line == LARGE_FILES_END:
+            inside = False
+        elif inside:
+            excluded.add(line)
+        else:
+            others.append(line)
+    return excluded, others
+
+
+# True when a file of the exclude block is now under MAX_FILE_SIZE
+def has_releasable_large_files(repo):
+    excluded, _ = read_large_file_excludes(repo)
+    for pattern in excluded:
+        try:
+            if os.lstat(os.path.join(repo.working_tree_dir, ignore_pattern_path(pattern))).st_size <= MAX_FILE_SIZE:
+                return True
+        except OSError:
+            continue
+    return False
+
+
+def write_large_file_excludes(repo, patterns):
+    _, others = read_large_file_excludes(repo)
+    lines = list(others)
+    if patterns:
+        lines += [LARGE_FILES_BEGIN, *sorted(patterns), LARGE_FILES_END]
+    os.makedirs(os.path.dirname(info_exclude_path(repo)), exist_ok=True)
+    with open(info_exclude_path(repo), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def lfs_available(repo):
+    global _lfs_available
+    if _lfs_available is None:
+        try:
+            repo.git.lfs("version")
+            _lfs_available = True
+        except GitCommandError:
+            print("⚠ Git LFS is not installed: large files will be excluded instead.")
+            _lfs_available = False
+    return _lfs_available
+
+
+# Size guard applied before staging. `sizes` maps the candidate paths
+# (relative, '/' separators) to their size; with complete=True it covers
+# the whole project and files that shrank are released. Files over
+# MAX_FILE_SIZE are either kept out of git through .git/info/exclude, or
+# tracked with Git LFS. Returns the paths that must not be staged and the
+# extra paths to stage (.gitattributes rewritten by `git lfs track`).
+def apply_large_file_policy(repo, folder_path, sizes, complete=False):
+    excluded, _ = read_large_file_excludes(repo)
+    if complete:
+        # Les fichiers déjà exclus n'apparaissent pas dans l'index : on les mesure à part
+        sizes = dict(sizes)
+        for pattern in excluded:
+            path = ignore_pattern_path(pattern)
+            if path not in sizes:
+                try:
+                    sizes[path] = os.lstat(os.path.join(folder_path, path)).st_size
+                except OSError:
+                    pass
+    large = {path: size for path, size in sizes.items() if size > MAX_FILE_SIZE}
+
+    if large and LARGE_FILE_POLICY == "lfs" and lfs_available(repo):
+        tracked = repo.git.lfs("track").splitlines()
+        new = [path for path in large if not any(line.strip().startswith(path + " ") for line in tracked)]
+        if new:
+            repo.git.lfs("install", "--local")
+            repo.git.lfs("track", "--filename", "--", *new)
+            for path in new:
+                print(f"📦 {path} ({format_size(large[path])}) is stored with Git LFS.")
+            return [], [".gitattributes"]
+        return [], []
+
+    wanted = set(excluded)
+    for path in sizes:
+        wanted.discard(literal_ignore_pattern(path))
+    if complete:
+        wanted = set()
+    wanted |= {literal_ignore_pattern(path) for path in large}
+
+    if wanted != excluded:
+        write_large_file_excludes(repo, wanted)
+        skipped = [path for path in large if literal_ignore_pattern(path) not in excluded]
+        if skipped:
+            print(f"⚠ {len(skipped)} file(s) over {format_size(MAX_FILE_SIZE)} not synced in {folder_path}:")
+            for path in skipped:
+                print(f"   - {path} ({format_size(large[path])})")
+    return list(large), []
+
+
+# Paths among `paths` that git already tracks
+def tracked_paths(repo, paths):
+    if not paths:
+        return []
+    return [path for path in repo.git.ls_files('-z', '--', *(":(literal)" + path for path in paths)).split("\0")
+            if path]
+
+
+# Stage changes in the index. With the paths reported by the watcher only
+# those paths are staged; a full `git add -A` is still run when no paths
+# are known, when the targeted add fails, and every FULL_STAGE_INTERVAL
+# seconds per project to catch anything the watcher missed.
+def stage_changes(repo, folder_path, changed_paths=None, deleted_paths=None):
+    project_key = os.path.abspath(folder_path)
+    now = time.monotonic()
+    last_full = _last_full_stage.get(project_key)
+    targeted = changed_paths is not None or deleted_paths is not None
+
+    if targeted and last_full is not None and now - last_full < FULL_STAGE_INTERVAL:
+        candidates = set(changed_paths or ()) | set(deleted_paths or ())
+        to_add = []
+        to_remove = []
+        sizes = {}
+        for path in candidates:
+            rel_path = os.path.relpath(path, project_key)
+            try:
+                st = os.lstat(path)
+                to_add.append(":(literal)" + rel_path)
+            except OSError:
+                to_remove.append(":(literal)" + rel_path)
+                sizes[rel_path.replace(os.sep, "/")] = 0
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                # Dossier déplacé ou créé d'un bloc : chaque fichier qu'il contient passe par la limite
+                sub_index = build_file_index(project_key, get_scan_matcher(project_key), rel_path.replace(os.sep, "/"))
+                sizes.update((sub_path, info[0]) for sub_path, info in sub_index.items())
+            else:
+                sizes[rel_path.replace(os.sep, "/")] = st.st_size
+
+        try:
+            too_large, extra = apply_large_file_policy(repo, folder_path, sizes)
+            if too_large:
+                skipped = {":(literal)" + path.replace("/", os.sep) for path in too_large}
+                to_add = [pathspec for pathspec in to_add if pathspec not in skipped]
+                # Fichiers déjà suivis sous un dossier ajouté : .git/info/exclude ne suffit pas
+                if to_add:
+                    to_add += [":(exclude,literal)" + path for path in tracked_paths(repo, too_large)]
+            to_add += [":(literal)" + path for path in extra if ":(literal)" + path not in to_add]
+            if to_add:
+                repo.git.add('-A', '--', *to_add)
+            if to_remove:
+                repo.git.rm('--cached', '-r', '-q', '--ignore-unmatch', '--', *to_remove)
+            return "targeted"
+        except GitCommandError as e:
+            print(f"Targeted staging failed in {folder_path}, falling back to full add: {e}")
+
+    # Taille de chaque fichier non ignoré, lue avant `git add`
+    index = build_file_index(project_key, get_scan_matcher(project_key))
+    # .gitattributes modifié par `git lfs track` est pris par le `git add -A`
+    too_large, _ = apply_large_file_policy(repo, folder_path, {path: info[0] for path, info in index.items()},
+                                           complete=True)
+    # Fichiers déjà suivis par git : .git/info/exclude ne suffit pas, ils sont écartés du `git add`
+    tracked_large = tracked_paths(repo, too_large)
+    if tracked_large:
+        repo.git.add('-A', '--', '.', *(":(exclude,literal)" + path for path in tracked_large))
+    else:
+        repo.git.add(A=True)
+    _last_full_stage[project_key] = now
+    return "full"
+
+
+# Check if the index differs from HEAD (everything to commit is staged)
+def has_staged_changes(repo):
+    try:
+        repo.head.commit
+    except ValueError:
+        return bool(repo.index.entries)
+    return repo.is_dirty(index=True, working_tree=False, untracked_files=False)
+
+
+# With push_if_clean=True, local commits left by an earlier failed push are
+# pushed even when there is nothing new to commit.
+def push_updates(folder_path, commit_message, changed_paths=None, deleted_paths=None, project_state=None,
+                 push_if_clean=False):
+    repo = get_repo(folder_path)
+
+    # 1. Ajouter à l'index (chemins ciblés ou tout le dossier)
+    with span("add"):
+        stage_changes(repo, folder_path, changed_paths, deleted_paths)
+        staged = has_staged_changes(repo)
+
+    if not staged:
+        if not push_if_clean:
+            print(f"No changes to commit in {folder_path}.")
+            return True
+        print(f"No new changes in {folder_path}, pushing pending local commits.")
+        return push_to_remote(repo, folder_path, project_state)
     
     # 2. COMMITTER 
     commit_date = get_commit_date(folder_path)
+    with span("commit"):
+        repo.index.commit(
+            commit_message,
+            author_date=commit_date,
+            commit_date=commit_date
+        )
+    print(f"Changes committed locally in {folder_path}.")
+
+    # 3. PULL + 4. PUSH
+    return push_to_remote(repo, folder_path, project_state)
+
+
+# Advertised tip of a remote branch (one ls-remote, no fetch and no merge).
+# Returns None when the branch does not exist on the remote yet.
+def get_remote_head(repo, branch):
+    output = repo.git.ls_remote('origin', f'refs/heads/{branch}')
+    return output.split()[0] if output else None
+
+
+# True when the local branch already contains the given commit
+def contains_commit(repo, sha):
+    try:
+        return repo.is_ancestor(sha, 'HEAD')
+    except GitCommandError:
+        # Commit absent localement : il faut le récupérer
+        return False
+
+
+# Subjects of the commits created by the scripts, possibly already squashed
+def is_autosave_subject(subject, project_name):
+    pattern = rf"(Auto-sync: |Update ){re.escape(project_name)}( \(\d+ autosaves squashed\))?"
+    return re.fullmatch(pattern, subject) is not None
+
+
+# Fold the autosave commits made since `base` (a commit the remote already
+# has) into a single commit with the same tree. Nothing is done when one of
+# them is a merge or was written by hand.
+def squash_autosaves(repo, folder_path, base):
+    project_name = os.path.basename(os.path.abspath(folder_path))
+    log = repo.git.log("--format=%H%x09%P%x09%s", f"{base}..HEAD")
+    commits = [line.split("\t", 2) for line in log.splitlines() if line]
+    if len(commits) < 2:
+        return False
+    for _, parents, subject in commits:
+        if " " in parents or not is_autosave_subject(subject, project_name):
+            return False
+
+    count = 0
+    for _, _, subject in commits:
+        match = re.search(r"\((\d+) autosaves squashed\)$", subject)
+        count += int(match.group(1)) if match else 1
+    newest_subject = re.sub(r" \(\d+ autosaves squashed\)$", "", commits[0][2])
+    repo.git.reset("--soft", base)
+    commit_date = get_commit_date(folder_path)
     repo.index.commit(
-        commit_message,
+        f"{newest_subject} ({count} autosaves squashed)",
         author_date=commit_date,
         commit_date=commit_date
     )
-    print(f"Changes committed locally in {folder_path}.")
+    print(f"Squashed {len(commits)} unpushed autosave commits in {folder_path}.")
+    return True
 
-    # 3. PULL 
-    if not pull_updates(folder_path):
-        print(f"Warning: Pull failed or processed conflicts in {folder_path}.")
 
-    # 4. PUSH
+# Pull only when the remote moved, then push. A rejected push triggers a
+# full pull and another attempt, up to PUSH_RETRIES times. The remote tip is
+# cached in project_state["remote_head"] when a state entry is given.
+def push_to_remote(repo, folder_path, project_state=None):
     try:
         current_branch = repo.active_branch.name
     except TypeError:
         print(f"couldn't determine current branch. cannot push changes.")
         return False
-    
-    try:
-        origin = repo.remote('origin')
-        push_infos = origin.push(refspec=f"{current_branch}:{current_branch}")
-        
-        success = True
+
+    cached_head = (project_state or {}).get("remote_head")
+    force_pull = False
+
+    for attempt in range(1, PUSH_RETRIES + 1):
+        needs_pull = True
+        if not force_pull:
+            try:
+                remote_head = get_remote_head(repo, current_branch)
+                known = remote_head is not None and (remote_head == cached_head or contains_commit(repo, remote_head))
+                needs_pull = remote_head is not None and not known
+            except GitCommandError as e:
+                known = False
+                print(f"Could not read remote head for {folder_path}: {e}")
+
+            # Seuls les commits absents du dépôt distant sont réécrits
+            if SQUASH_AUTOSAVES and known and attempt == 1:
+                try:
+                    squash_autosaves(repo, folder_path, remote_head)
+                except GitCommandError as e:
+                    print(f"Could not squash autosave commits in {folder_path}: {e}")
+
+        if needs_pull:
+            old_head = read_head_commit(folder_path)
+            with span("pull"):
+                pulled = pull_updates(folder_path)
+            if not pulled:
+                print(f"Warning: Pull failed or processed conflicts in {folder_path}.")
+            # Fichiers réécrits par la fusion : le watcher ne doit pas les renvoyer
+            record_tree_update(repo, folder_path, old_head)
+        else:
+            print(f"Remote unchanged for {current_branch}, skipping pull.")
+
+        try:
+            origin = repo.remote('origin')
+            with span("push"):
+                push_infos = origin.push(refspec=f"{current_branch}:{current_branch}")
+        except Exception as e:
+            print(f"Failed to push changes: {e}")
+            return False
+
+        rejected = False
+        failed = False
         for info in push_infos:
-            if info.flags & info.ERROR:
+            if info.flags & info.REJECTED:
+                print(f"⚠ Push rejected for {info.remote_ref_string} (remote has new commits).")
+                rejected = True
+            elif info.flags & (info.ERROR | info.REMOTE_REJECTED | info.REMOTE_FAILURE):
                 print(f"✗ Push failed for {info.remote_ref_string}: {info.summary}")
-                success = False
-        
-        if success:
+                failed = True
+
+        if failed:
+            return False
+
+        if not rejected:
+            if project_state is not None:
+                project_state["remote_head"] = repo.head.commit.hexsha
             print(f"Succesfully pushed changes to remote repository from {folder_path}.")
             return True
-        else:
-            return False
 
-    except Exception as e:
-        print(f"Failed to push changes: {e}")
-        return False
+        if attempt < PUSH_RETRIES:
+            print(f"Retrying push after a full pull ({attempt}/{PUSH_RETRIES})...")
+        force_pull = True
+
+    print(f"✗ Push still rejected after {PUSH_RETRIES} attempts for {folder_path}.")
+    return False
+
+
+# Output of `git count-objects -v` as a dict of ints
+def count_objects(repo):
+    stats = {}
+    for line in repo.git.count_objects("-v").splitlines():
+        key, _, value = line.partition(":")
+        if value.strip().isdigit():
+            stats[key.strip()] = int(value)
+    return stats
+
+
+# Repository housekeeping: `gc --auto` packs loose objects when git deems
+# it worthwhile, the commit-graph and multi-pack-index speed up history
+# walks and object lookups. Returns the state fields recording its cost.
+def maintain_repository(folder_path):
+    repo = get_repo(folder_path)
+    before = count_objects(repo)
+    start = time.perf_counter()
+
+    try:
+        repo.git.gc("--auto", "--quiet")
+    except GitCommandError as e:
+        print(f"Maintenance step 'git gc --auto' failed in {folder_path}: {e}")
+    try:
+        repo.git.commit_graph("write", "--reachable", "--changed-paths")
+    except GitCommandError as e:
+        print(f"Maintenance step 'git commit-graph write' failed in {folder_path}: {e}")
+
+    # Sans pack, il n'y a rien à indexer
+    after = count_objects(repo)
+    if after.get("packs"):
+        try:
+            repo.git.multi_pack_index("write")
+        except GitCommandError as e:
+            print(f"Maintenance step 'git multi-pack-index write' failed in {folder_path}: {e}")
 
+    elapsed = time.perf_counter() - start
+    print(f"🧹 Maintenance of {os.path.basename(folder_path)} took {elapsed:.2f}s: "
+          f"{before.get('count', 0)} → {after.get('count', 0)} loose objects, "
+          f"{after.get('size-pack', 0)} KiB packed.")
+    return {
+        "last_maintenance": time.time(),
+        "maintenance_seconds": round(elapsed, 3),
+        "loose_objects": after.get("count", 0),
+        "pack_size_kib": after.get("size-pack", 0)
+    }
 
-def sync_projects(github_client, username, state):
+
+def maintenance_due(entry, now=None):
+    return isinstance(entry, dict) and (now or time.time()) - entry.get("last_maintenance", 0) >= MAINTENANCE_INTERVAL
+
+
+def utc_now_iso():
+    return datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
+
+
+# State fields recorded after a successful sync
+def sync_success_fields(project_path, entry=None):
+    fields = {"last_sync": utc_now_iso(), "failure_count": 0, "pending_push": None}
+    if entry and entry.get("remote_head"):
+        fields["remote_head"] = entry["remote_head"]
+    try:
+        fields["last_pushed_commit"] = get_repo(project_path).head.commit.hexsha
+    except (InvalidGitRepositoryError, ValueError):
+        pass
+    return fields
+
+
+# Delay before the next push attempt: exponential backoff with jitter
+def push_retry_delay(attempts):
+    delay = min(PUSH_RETRY_MAX_DELAY, PUSH_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+# State fields recorded after a failed sync of a tracked project. The
+# project is put in the persistent push queue ("pending_push"), retried
+# with exponential backoff until a push succeeds.
+def sync_failure_fields(entry):
+    pending = (entry or {}).get("pending_push") or {}
+    attempts = pending.get("attempts", 0) + 1
+    return {
+        "failure_count": (entry or {}).get("failure_count", 0) + 1,
+        "last_failure": utc_now_iso(),
+        "pending_push": {
+            "since": pending.get("since") or utc_now_iso(),
+            "attempts": attempts,
+            "next_attempt": time.time() + push_retry_delay(attempts)
+        }
+    }
+
+
+# True when a queued push of this project is due for another attempt
+def push_retry_due(entry, now=None):
+    pending = (entry or {}).get("pending_push")
+    return bool(pending) and pending.get("next_attempt", 0) <= (now or time.time())
+
+
+# True when HEAD moved since the last push (commits made outside the script)
+def has_unpushed_head(project_path, entry):
+    head = read_head_commit(project_path)
+    return bool(head and entry.get("last_pushed_commit") and head != entry["last_pushed_commit"])
+
+
+# True when local commits have to be pushed even without new changes. Once
+# a push is queued only its backoff decides: HEAD differs from the last
+# pushed commit until the push succeeds.
+def push_wanted(project_path, entry):
+    if entry.get("pending_push"):
+        return push_retry_due(entry)
+    return has_unpushed_head(project_path, entry)
+
+
+# Checks run on a tracked project before starting git. Returns
+# (unchanged, index): unchanged is the reason the project can be skipped
+# (None when it needs a sync) and index the file index built on the way
+# (None when the watermark was enough).
+def check_tracked_project(project_path, entry, incremental=INCREMENTAL_SCAN):
+    matcher = get_scan_matcher(project_path)
+    if push_wanted(project_path, entry):
+        return None, build_file_index(project_path, matcher)
+
+    # Rien n'a bougé depuis le dernier passage : ni index, ni git
+    if incremental and unchanged_since_watermark(project_path, entry, matcher):
+        return "unchanged since last scan", None
+
+    # Empreinte inchangée depuis la dernière synchro : pas besoin de git
+    index = build_file_index(project_path, matcher)
+    if entry.get("fingerprint") == fingerprint_index(index):
+        return "fingerprint unchanged", index
+    return None, index
+
+
+# Turn a folder name into a valid GitHub repository name
+def make_repo_name(project_name):
+    repo_name = project_name.replace(" ", "-").replace("_", "-").lower()
+    return "".join(c for c in repo_name if c.isalnum() or c == "-")
+
+
+# List the project folders found in the parent directories
+def scan_projects(parents=None, verbose=True):
     potential_projects = {}
 
     # Scan des répertoires parents
-    for parent_folder in PARENT_DIRECTORIES:
+    for parent_folder in parents or PARENT_DIRECTORIES:
         if not os.path.isdir(parent_folder):
             print(f"Parent folder not found: {parent_folder}")
             continue
         
-        print(f"\nScanning inside: {parent_folder}")
+        if verbose:
+            print(f"\nScanning inside: {parent_folder}")
         
         try:
-            for item_name in os.listdir(parent_folder):
-                item_path = os.path.join(parent_folder, item_name)
-                
-                if not os.path.isdir(item_path) or item_name.startswith('.'):
-                    continue
-                
-                print(f"Found directory: {item_name}")
-                potential_projects[item_path] = None
+            with os.scandir(parent_folder) as entries:
+                for entry in entries:
+                    if not entry.is_dir() or entry.name.startswith('.'):
+                        continue
+
+                    if verbose:
+                        print(f"Found directory: {entry.name}")
+                    potential_projects[os.path.join(parent_folder, entry.name)] = None
                 
         except PermissionError:
             print(f"Permission denied scanning directory {parent_folder}. Skipping.")
         except Exception as e:
             print(f"Error scanning directory {parent_folder}: {e}")
+
+    return list(potential_projects)
+
+
+# Sync a single project. Works on a copy of its state entry and returns
+# (status, updates) so the caller can merge the result into the shared state.
+# With incremental=True a tracked project untouched since its watermark is
+# skipped without building its file index.
+def sync_project(project_path, github_client, username, entry, catalog=None, incremental=INCREMENTAL_SCAN):
+    project_name = os.path.basename(project_path)
+    repo_name = make_repo_name(project_name)
     
-    print(f"\nFound {len(potential_projects)} potential projects to sync")
-    
-    # Traiter chaque projet
-    synced_count = 0
-    failed_count = 0
+    print(f"\n{'='*60}")
+    print(f"Processing project: {project_name}")
+    print(f"Repository name: {repo_name}")
+    print(f"{'='*60}")
     
-    for project_path in potential_projects.keys():
-        project_name = os.path.basename(project_path)
-        
-        # Nettoyer le nom du repo
-        repo_name = project_name.replace(" ", "-").replace("_", "-").lower()
-        repo_name = "".join(c for c in repo_name if c.isalnum() or c == "-")
-        
-        print(f"\n{'='*60}")
-        print(f"Processing project: {project_name}")
-        print(f"Repository name: {repo_name}")
-        print(f"{'='*60}")
+    # Vérifier si déjà synchronisé
+    if isinstance(entry, dict):
+        print(f"Project already tracked. Checking for updates...")
+
+        started_ns = time.time_ns()
+        with span("dirty_check"):
+            unchanged, index = check_tracked_project(project_path, entry, incremental)
+        if unchanged:
+            print(f"✓ No changes detected in {project_name} ({unchanged})")
+            # Repère mis à jour seulement si l'index a dû être reconstruit
+            return "synced", scan_watermark_fields(project_path, started_ns) if index is not None else None
+
+        # Commits créés hors du script (ou laissés par un push échoué) à pousser
+        retry_push = push_wanted(project_path, entry)
         
-        # Vérifier si déjà synchronisé
-        if project_path in state:
-            print(f"Project already tracked. Checking for updates...")
-            
-            try:
-                repo = Repo(project_path)
-                
-                if has_uncommited_changes(repo):
+        try:
+            repo = get_repo(project_path)
+            with span("dirty_check"):
+                dirty = has_uncommited_changes(repo)
+
+            if dirty or retry_push:
+                if retry_push and entry.get("pending_push"):
+                    print(f"Retrying queued push (attempt {entry['pending_push']['attempts'] + 1})...")
+                elif retry_push:
+                    print("Local commits not pushed yet. Pushing updates...")
+                else:
                     print(f"Changes detected. Pushing updates...")
-                    if push_updates(project_path, f"Update {project_name}"):
-                        state[project_path]["last_sync"] = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
-                        synced_count += 1
-                        print(f"✓ Successfully updated {project_name}")
-                    else:
-                        failed_count += 1
-                        print(f"✗ Failed to update {project_name}")
+                if push_updates(project_path, f"Update {project_name}", project_state=entry, push_if_clean=retry_push):
+                    print(f"✓ Successfully updated {project_name}")
+                    return "synced", {**sync_success_fields(project_path, entry), **file_index_fields(index),
+                                      **scan_watermark_fields(project_path, started_ns)}
+                print(f"✗ Failed to update {project_name}")
+                return "failed", sync_failure_fields(entry)
+
+            print(f"✓ No changes detected in {project_name}")
+            return "synced", {**file_index_fields(index), **scan_watermark_fields(project_path, started_ns)}
+                
+        except InvalidGitRepositoryError:
+            print(f"Not a valid git repository. Re-initializing...")
+            return "skipped", None
+        except Exception as e:
+            print(f"✗ Error checking {project_name}: {e}")
+            return "failed", sync_failure_fields(entry)
+    
+    # Pas encore synchronisé : créer le repo GitHub
+    repo_url = create_github_repo(
+        repo_name=repo_name,
+        is_private=True,
+        description=f"Project: {project_name}",
+        github_client=github_client,
+        username=username,
+        catalog=catalog
+    )
+    
+    if not repo_url:
+        print(f"✗ Skipping {project_name} - failed to create/access repo")
+        return "failed", None
+    
+    # Initialiser le repo local et pousser
+    started_ns = time.time_ns()
+    if initialize_local_repo(project_path, repo_url):
+        print(f"✓ Successfully synced {project_name}")
+        return "synced", {
+            "repo_name": repo_name,
+            "repo_url": repo_url,
+            **sync_success_fields(project_path),
+            **file_index_fields(build_file_index(project_path, get_scan_matcher(project_path))),
+            **scan_watermark_fields(project_path, started_ns)
+        }
+
+    print(f"✗ Failed to initialize {project_name}")
+    return "failed", None
+
+
+# Merge the result of sync_project into the shared state and save the
+# changed fields right away
+def merge_project_state(state, project_path, updates, state_lock):
+    if not updates:
+        return
+    save_project_state(project_path, updates)
+    with state_lock:
+        entry = state.get(project_path)
+        if isinstance(entry, dict):
+            entry.update(updates)
+        else:
+            state[project_path] = dict(updates)
+
+
+# With a plan (see build_plan), only its actions are executed: no scan and
+# no change detection.
+def sync_projects(github_client, username, state, workers=SYNC_WORKERS, state_lock=None, catalog=None,
+                  incremental=INCREMENTAL_SCAN, plan=None):
+    state_lock = state_lock or threading.Lock()
+    if plan is None:
+        actions = {}
+        with span("scan"):
+            potential_projects = scan_projects()
+        print(f"\nFound {len(potential_projects)} potential projects to sync")
+    else:
+        actions = {item["path"]: item["action"] for item in plan["projects"] if item["action"] != "none"}
+        potential_projects = list(actions)
+        print(f"\nApplying plan of {plan['created_at']}: {len(potential_projects)} action(s)")
+
+    results = {"synced": [], "failed": [], "skipped": []}
+    timings = {}
+    pass_start = time.perf_counter()
+
+    def run(project_path):
+        with state_lock:
+            entry = state.get(project_path)
+            entry = dict(entry) if isinstance(entry, dict) else None
+
+        start = time.perf_counter()
+        try:
+            with project_lock(project_path, PROJECT_LOCK_TIMEOUT), lease_repo(project_path), \
+                    default_profiler.profile(project_path):
+                if project_path in actions:
+                    status, updates = apply_plan_action(project_path, actions[project_path], github_client, username,
+                                                        entry, catalog)
                 else:
-                    print(f"✓ No changes detected in {project_name}")
-                    synced_count += 1
-                    
-            except InvalidGitRepositoryError:
-                print(f"Not a valid git repository. Re-initializing...")
-            except Exception as e:
-                print(f"✗ Error checking {project_name}: {e}")
-                failed_count += 1
-                continue
-        
-        # Si pas encore synchronisé ou erreur détectée
-        if project_path not in state or not isinstance(state.get(project_path), dict):
-            # Créer le repo GitHub
-            repo_url = create_github_repo(
-                repo_name=repo_name,
-                is_private=True,
-                description=f"Project: {project_name}",
-                github_client=github_client,
-                username=username
-            )
-            
-            if not repo_url:
-                print(f"✗ Skipping {project_name} - failed to create/access repo")
-                failed_count += 1
-                continue
-            
-            # Initialiser le repo local et pousser
-            if initialize_local_repo(project_path, repo_url):
-                state[project_path] = {
-                    "repo_name": repo_name,
-                    "repo_url": repo_url,
-                    "last_sync": datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
-                }
-                synced_count += 1
-                print(f"✓ Successfully synced {project_name}")
-            else:
-                failed_count += 1
-                print(f"✗ Failed to initialize {project_name}")
+                    status, updates = sync_project(project_path, github_client, username, entry, catalog, incremental)
+        except ProjectLockBusy:
+            print(f"⏭ {os.path.basename(project_path)} is being synced by another process. Skipping.")
+            status, updates = "skipped", None
+        except Exception as e:
+            print(f"✗ Unexpected error syncing {project_path}: {e}")
+            status, updates = "failed", None
+        elapsed = time.perf_counter() - start
+        record_sync(os.path.basename(project_path), status, elapsed)
+        return status, updates, elapsed
+
+    # Traiter chaque projet, en parallèle si workers > 1
+    if workers > 1 and len(potential_projects) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sync") as executor:
+            futures = {executor.submit(run, path): path for path in potential_projects}
+            outcomes = ((futures[future], future.result()) for future in as_completed(futures))
+            for project_path, (status, updates, elapsed) in outcomes:
+                merge_project_state(state, project_path, updates, state_lock)
+                results[status].append(project_path)
+                timings[project_path] = elapsed
+    else:
+        for project_path in potential_projects:
+            status, updates, elapsed = run(project_path)
+            merge_project_state(state, project_path, updates, state_lock)
+            results[status].append(project_path)
+            timings[project_path] = elapsed
+
+    print_sync_summary(results, timings, time.perf_counter() - pass_start)
     return state
 
 
+# Maintenance of every tracked project that is due, one at a time
+def run_maintenance(state):
+    total = 0.0
+    for project_path, entry in list(state.items()):
+        if not maintenance_due(entry) or not os.path.isdir(project_path):
+            continue
+        try:
+            with project_lock(project_path), lease_repo(project_path):
+                fields = maintain_repository(project_path)
+        except ProjectLockBusy:
+            print(f"⏭ {os.path.basename(project_path)} is locked. Maintenance skipped.")
+            continue
+        except (InvalidGitRepositoryError, GitCommandError) as e:
+            print(f"✗ Maintenance failed for {project_path}: {e}")
+            continue
+        entry.update(fields)
+        save_project_state(project_path, fields)
+        total += fields["maintenance_seconds"]
+    print(f"🧹 Maintenance done in {total:.2f}s.")
+
+
+# Clone URL of a tracked project with the token of this machine: the URL
+# saved in the state may carry the token of the machine that created it
+def restore_clone_url(repo_url):
+    return authenticated_url(re.sub(r"^https://[^/@]*@", "https://", repo_url))
+
+
+# Clone one tracked project back into its folder. The clone is made in a
+# hidden folder next to it (ignored by the scan and the watchers) and
+# renamed once complete, so an interrupted restore never leaves a
+# half-cloned project: the next run deletes the leftover and starts over.
+# Partial clone (blobs fetched on demand) and optional shallow history.
+def restore_project(project_path, entry, depth=None):
+    project_name = os.path.basename(project_path)
+    if os.path.isdir(os.path.join(project_path, ".git")):
+        return "present", None
+    if os.path.isdir(project_path) and os.listdir(project_path):
+        print(f"⏭ {project_name} exists without a git repository. Not overwritten.")
+        return "skipped", None
+    if not entry.get("repo_url"):
+        print(f"⏭ {project_name} has no repo_url in the state.")
+        return "skipped", None
+
+    parent = os.path.dirname(os.path.abspath(project_path))
+    os.makedirs(parent, exist_ok=True)
+    temp_path = os.path.join(parent, f".restore-{project_name}")
+    if os.path.exists(temp_path):
+        print(f"Removing unfinished restore of {project_name}...")
+        shutil.rmtree(temp_path)
+
+    clone_url = restore_clone_url(entry["repo_url"])
+    options = {"filter": "blob:none"}
+    if depth:
+        options["depth"] = depth
+    try:
+        Repo.clone_from(clone_url, temp_path, **options).close()
+    except GitCommandError as e:
+        print(f"✗ Clone failed for {project_name}: {e.stderr.strip() if e.stderr else e}")
+        shutil.rmtree(temp_path, ignore_errors=True)
+        return "failed", None
+
+    if os.path.isdir(project_path):
+        os.rmdir(project_path)   # dossier vide
+    os.rename(temp_path, project_path)
+    started_ns = time.time_ns()
+
+    # Dépôt identique au distant : rien à pousser, repère de scan à jour
+    repo = get_repo(project_path)
+    fields = sync_success_fields(project_path)
+    fields["repo_url"] = clone_url
+    if "last_pushed_commit" in fields:
+        fields["remote_head"] = fields["last_pushed_commit"]
+    fields.update(file_index_fields(build_file_index(project_path, get_scan_matcher(project_path))))
+    fields.update(scan_watermark_fields(project_path, started_ns))
+    print(f"✓ Restored {project_name} ({repo.active_branch.name if not repo.head.is_detached else 'detached'})")
+    return "restored", fields
+
+
+# Restore every tracked project missing on this machine, in parallel. Each
+# restored project is saved to the state right away, so an interrupted run
+# resumes where it stopped.
+def restore_projects(state, workers=SYNC_WORKERS, depth=None):
+    results = {"restored": [], "present": [], "skipped": [], "failed": []}
+    start = time.perf_counter()
+
+    def run(project_path, entry):
+        try:
+            with project_lock(project_path, PROJECT_LOCK_TIMEOUT), lease_repo(project_path):
+                status, fields = restore_project(project_path, entry, depth)
+        except ProjectLockBusy:
+            print(f"⏭ {os.path.basename(project_path)} is locked by another process. Skipping.")
+            return "skipped", None
+        except Exception as e:
+            print(f"✗ Unexpected error restoring {project_path}: {e}")
+            return "failed", None
+        if fields:
+            save_project_state(project_path, fields)
+        return status, fields
+
+    tracked = [(path, entry) for path, entry in state.items() if isinstance(entry, dict)]
+    print(f"Restoring {len(tracked)} tracked project(s) with {workers} worker(s)...")
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="restore") as executor:
+        futures = {executor.submit(run, path, entry): path for path, entry in tracked}
+        for future in as_completed(futures):
+            project_path = futures[future]
+            status, fields = future.result()
+            if fields:
+                state[project_path].update(fields)
+            results[status].append(project_path)
+
+    print(f"\n✓ Restored: {len(results['restored'])}  Already present: {len(results['present'])}  "
+          f"⏭ Skipped: {len(results['skipped'])}  ✗ Failed: {len(results['failed'])}  "
+          f"(total {time.perf_counter() - start:.2f}s)")
+    for project_path in results["failed"]:
+        print(f"  ✗ {os.path.basename(project_path)}")
+    return results
+
+
+PLAN_VERSION = 1
+PLAN_STATES = ["new", "missing", "conflict", "rebase", "dirty", "ahead", "behind", "clean", "no_repository"]
+
+
+# Local-only status of one project, without network and without GitHub:
+#   new       not tracked yet                 -> "create"
+#   missing   tracked but not on disk         -> "restore"
+#   conflict  unfinished merge                -> "resolve" (merge redone, then sync)
+#   rebase    unfinished rebase               -> "none" (to finish or abort by hand,
+#                                                pull_updates only redoes merges)
+#   dirty     uncommitted changes             -> "sync"
+#   ahead     local commits not pushed        -> "sync"
+#   behind    origin/<branch> (as of the last fetch or push) not merged
+#                                             -> "sync"
+# The fingerprint and watermark checks of sync_projects come first, so
+# `git status` only runs on projects whose files changed.
+def plan_project(project_path, entry, incremental=INCREMENTAL_SCAN):
+    item = {"path": project_path, "name": os.path.basename(project_path)}
+    if not isinstance(entry, dict):
+        item.update(states=["new"], action="create")
+        return item
+    if not os.path.isdir(project_path):
+        item.update(states=["missing"], action="restore")
+        return item
+    git_dir = os.path.join(project_path, ".git")
+    if not os.path.isdir(git_dir):
+        item.update(states=["no_repository"], action="none")
+        return item
+
+    states = []
+    if os.path.exists(os.path.join(git_dir, "MERGE_HEAD")):
+        states.append("conflict")
+    if any(os.path.exists(os.path.join(git_dir, name)) for name in ("rebase-merge", "rebase-apply")):
+        states.append("rebase")
+
+    with lease_repo(project_path):
+        unchanged, _ = check_tracked_project(project_path, entry, incremental)
+        if not unchanged and has_uncommited_changes(get_repo(project_path)):
+            states.append("dirty")
+        if entry.get("pending_push") or has_unpushed_head(project_path, entry):
+            states.append("ahead")
+
+        head_ref, head = read_head(project_path), read_head_commit(project_path)
+        if head_ref and head_ref.startswith("ref: refs/heads/"):
+            tracking = read_ref(git_dir, "refs/remotes/origin/" + head_ref[len("ref: refs/heads/"):])
+            if tracking and head and tracking != head and not contains_commit(get_repo(project_path), tracking):
+                states.append("behind")
+
+    if "rebase" in states:
+        action = "none"
+    else:
+        action = "resolve" if "conflict" in states else "sync" if states else "none"
+    item.update(states=states or ["clean"], action=action, head=head)
+    if entry.get("pending_push"):
+        item["pending_push_attempts"] = entry["pending_push"].get("attempts", 0)
+    return item
+
+
+# What a run of sync_projects would do, computed in parallel from the state
+# and local checks only. The plan can be saved and executed as-is with
+# sync_projects(..., plan=plan): no scan and no new checks at that point.
+def build_plan(state, parents=None, workers=SYNC_WORKERS, incremental=INCREMENTAL_SCAN):
+    start = time.perf_counter()
+    with span("scan"):
+        projects = scan_projects(parents, verbose=False)
+    # Projets suivis absents du disque (nouvelle machine, dossier supprimé)
+    for project_path, entry in state.items():
+        if isinstance(entry, dict) and project_path not in projects and not os.path.isdir(project_path):
+            projects.append(project_path)
+
+    def run(project_path):
+        try:
+            with span("dirty_check"):
+                return plan_project(project_path, state.get(project_path), incremental)
+        except Exception as e:
+            return {"path": project_path, "name": os.path.basename(project_path),
+                    "states": ["error"], "action": "none", "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="plan") as executor:
+        items = list(executor.map(run, projects))
+
+    return {
+        "version": PLAN_VERSION,
+        "created_at": utc_now_iso(),
+        "parents": list(parents or PARENT_DIRECTORIES),
+        "elapsed_seconds": round(time.perf_counter() - start, 3),
+        "projects": sorted(items, key=lambda item: item["path"]),
+    }
+
+
+def print_plan(plan):
+    counts = {}
+    for item in plan["projects"]:
+        for state in item["states"]:
+            counts[state] = counts.get(state, 0) + 1
+        if item["action"] != "none" or item["states"] != ["clean"]:
+            print(f"  {item['action']:<8} {item['name']:<40} {', '.join(item['states'])}"
+                  + (f"  ({item['error']})" if item.get("error") else ""))
+
+    actions = sum(1 for item in plan["projects"] if item["action"] != "none")
+    summary = ", ".join(f"{counts[state]} {state}" for state in PLAN_STATES + ["error"] if state in counts)
+    print(f"\n{len(plan['projects'])} project(s): {summary or 'none'}. "
+          f"{actions} action(s) planned (computed in {plan['elapsed_seconds']:.2f}s, no network).")
+
+
+def load_plan(path):
+    with open(path) as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"unsupported plan version: {plan.get('version')}")
+    return plan
+
+
+# Execute one action of a plan
+def apply_plan_action(project_path, action, github_client, username, entry, catalog=None):
+    if action == "create":
+        return sync_project(project_path, github_client, username, None, catalog)
+    if action == "restore":
+        status, fields = restore_project(project_path, entry or {})
+        return ("synced" if status in ("restored", "present") else status), fields
+
+    # Fusion inachevée : pull_updates l'annule et la refait (copies _local_ en cas de conflit)
+    if action == "resolve":
+        with span("pull"):
+            pull_updates(project_path)
+
+    # "sync" : commit, pull si nécessaire, push
+    project_name = os.path.basename(project_path)
+    started_ns = time.time_ns()
+    index = build_file_index(project_path, get_scan_matcher(project_path))
+    if push_updates(project_path, f"Update {project_name}", project_state=entry, push_if_clean=True):
+        print(f"✓ Successfully updated {project_name}")
+        return "synced", {**sync_success_fields(project_path, entry), **file_index_fields(index),
+                          **scan_watermark_fields(project_path, started_ns)}
+    print(f"✗ Failed to update {project_name}")
+    return "failed", sync_failure_fields(entry)
+
+
+# Print per-project timings and the final synced/failed counts
+def print_sync_summary(results, timings, total_elapsed):
+    print(f"\n{'='*60}")
+    print("Sync summary")
+    print(f"{'='*60}")
+    for project_path, elapsed in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {elapsed:7.2f}s  {os.path.basename(project_path)}")
+
+    print(f"\n✓ Synced: {len(results['synced'])}  ✗ Failed: {len(results['failed'])}  "
+          f"⏭ Skipped: {len(results['skipped'])}  (total {total_elapsed:.2f}s)")
+    for project_path in results["failed"]:
+        print(f"  ✗ {os.path.basename(project_path)}")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Sync local project folders to GitHub.")
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS,
+                        help="number of projects synced in parallel (1 = sequential)")
+    parser.add_argument("--full-scan", action="store_true",
+                        help="check every project, ignoring the watermarks of the last scan")
+    parser.add_argument("--maintenance", action="store_true",
+                        help="after the sync, run git maintenance on projects not maintained for MAINTENANCE_INTERVAL")
+    parser.add_argument("--restore", action="store_true",
+                        help="clone the tracked projects missing on this machine instead of syncing")
+    parser.add_argument("--depth", type=int, metavar="N",
+                        help="with --restore, fetch only the last N commits of each project")
+    parser.add_argument("--plan", metavar="FILE", nargs="?", const="",
+                        help="show what a sync would do, from the state and local checks only (no network); "
+                             "with FILE, also save the plan as JSON ('-' for stdout)")
+    parser.add_argument("--apply", metavar="FILE",
+                        help="execute a plan saved with --plan FILE, without scanning again")
+    parser.add_argument("--metrics-json", metavar="FILE",
+                        help="write the phase timings, counters and histograms of this run to FILE")
+    parser.add_argument("--profile", metavar="PROJECT", nargs="?", const="*",
+                        help="profile the sync of PROJECT (or the first project synced) with cProfile")
+    args = parser.parse_args()
+    if args.profile:
+        default_profiler.arm(args.profile)
+
+    if args.plan is not None:
+        try:
+            # Avec "-", stdout ne reçoit que le JSON : les messages passent sur stderr
+            with contextlib.redirect_stdout(sys.stderr if args.plan == "-" else sys.stdout):
+                plan = build_plan(load_state(), workers=args.workers, incremental=not args.full_scan)
+            if args.plan == "-":
+                print(json.dumps(plan, indent=2))
+                return
+            print_plan(plan)
+            if args.plan:
+                atomic_write_json(args.plan, plan)
+                print(f"Plan written to {args.plan}. Run it with: python sync_script.py --apply {args.plan}")
+        finally:
+            close_repos()
+        return
+
     try:
         token, username, email = load_config()
-        auth = Auth.Token(token)
-        github_client = Github(auth=auth)
+        github_client = make_github_client(token, pool_size=args.workers)
+        catalog = GithubRepoCatalog(github_client)
         
         state = load_state()
-        updated_state = sync_projects(github_client, username, state)
-        save_state(updated_state)
+        if args.restore:
+            restore_projects(state, workers=args.workers, depth=args.depth)
+            return
+
+        plan = load_plan(args.apply) if args.apply else None
+        updated_state = sync_projects(github_client, username, state, workers=args.workers, catalog=catalog,
+                                      incremental=not args.full_scan, plan=plan)
+        if args.maintenance:
+            run_maintenance(updated_state)
         
     except ValueError as e:
         print(f"✗ Configuration error: {e}")
@@ -429,6 +1706,11 @@ def main():
         print(f"✗ Unexpected error: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        close_repos()
+        if args.metrics_json:
+            atomic_write_json(args.metrics_json, default_registry.snapshot())
+            print(f"📈 Metrics written to {args.metrics_json}")
 
 
 if __name__ == "__main__":
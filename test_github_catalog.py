@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from github import Auth, Github
+from fake_github import FakeGithubServer
+from github_catalog import GithubRepoCatalog, TokenBucket, rate_limited
+from sync_script import create_github_repo
+
+
+# GitHub API calls against fake_github.py: pagination and TTL cache of the
+# catalog, reuse of an existing repository (422) and the rate limiter.
+# Request counts come from the server itself.
+class GithubCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="catalog-test-")
+        self.cache_file = os.path.join(self.tmp, "cache.json")
+        self.server = self.start_server()
+        env = mock.patch.dict(os.environ, {"GITHUB_API_TOKEN": "token"})
+        env.start()
+        self.addCleanup(env.stop)
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def start_server(self, rate_limit=0):
+        server = FakeGithubServer(os.path.join(self.tmp, f"remotes-{rate_limit}"), rate_limit=rate_limit).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def client(self, server=None, per_page=100):
+        return Github(auth=Auth.Token("token"), base_url=(server or self.server).url, per_page=per_page)
+
+    def limiter(self):
+        return TokenBucket(rate=1000, capacity=1000)
+
+    def test_refresh_reads_every_page(self):
+        for i in range(5):
+            self.server.create_repo(f"Repo{i}")
+
+        catalog = GithubRepoCatalog(self.client(per_page=2), cache_file=self.cache_file, limiter=self.limiter())
+        catalog.refresh()
+
+        self.assertEqual(sorted(catalog.repos), [f"repo{i}" for i in range(5)])
+        self.assertEqual(catalog.lookup("REPO3"), self.server.repo_path("Repo3"))
+        # 2 + 2 + 1 dépôts
+        self.assertEqual(self.server.request_counts.get("GET /user/repos"), 3)
+
+    def test_full_last_page_needs_one_more_request(self):
+        for i in range(4):
+            self.server.create_repo(f"repo{i}")
+
+        catalog = GithubRepoCatalog(self.client(per_page=2), cache_file=None, limiter=self.limiter())
+        catalog.refresh()
+
+        self.assertEqual(len(catalog.repos), 4)
+        self.assertEqual(self.server.request_counts.get("GET /user/repos"), 3)
+
+    def test_cache_is_reused_until_ttl(self):
+        self.server.create_repo("cached")
+        GithubRepoCatalog(self.client(), cache_file=self.cache_file, limiter=self.limiter()).refresh()
+        self.assertEqual(self.server.request_counts.get("GET /user/repos"), 1)
+
+        # Nouveau processus : le cache disque suffit
+        catalog = GithubRepoCatalog(self.client(), cache_file=self.cache_file, limiter=self.limiter())
+        self.assertEqual(catalog.lookup("cached"), self.server.repo_path("cached"))
+        self.assertIsNone(catalog.lookup("missing"))
+        self.assertEqual(self.server.request_counts.get("GET /user/repos"), 1)
+
+        # Cache expiré : la liste est relue
+        expired = GithubRepoCatalog(self.client(), cache_file=self.cache_file, ttl=0, limiter=self.limiter())
+        self.assertEqual(expired.lookup("cached"), self.server.repo_path("cached"))
+        self.assertEqual(self.server.request_counts.get("GET /user/repos"), 2)
+
+    def test_catalog_hit_skips_creation(self):
+        self.server.create_repo("known")
+        catalog = GithubRepoCatalog(self.client(), cache_file=self.cache_file, limiter=self.limiter())
+
+        url = create_github_repo("known", True, "", self.client(), "local-user", catalog)
+
+        self.assertEqual(url, self.server.repo_path("known"))
+        self.assertNotIn("POST /user/repos", self.server.request_counts)
+
+    def test_existing_repository_is_reused_after_422(self):
+        self.server.create_repo("existing")
+
+        url = create_github_repo("existing", True, "", self.client(), "local-user")
+
+        self.assertEqual(url, self.server.repo_path("existing"))
+        self.assertEqual(self.server.request_counts.get("POST /user/repos"), 1)
+        self.assertEqual(self.server.request_counts.get("GET /repos"), 1)
+
+    def test_created_repository_is_added_to_catalog(self):
+        catalog = GithubRepoCatalog(self.client(), cache_file=self.cache_file, limiter=self.limiter())
+        catalog.refresh()
+
+        url = create_github_repo("fresh", True, "", self.client(), "local-user", catalog)
+
+        self.assertEqual(url, self.server.repo_path("fresh"))
+        self.assertEqual(catalog.lookup("fresh"), self.server.repo_path("fresh"))
+        self.assertEqual(self.server.request_counts.get("GET /user/repos"), 1)
+
+    def test_bucket_waits_for_reset_when_quota_is_exhausted(self):
+        server = self.start_server(rate_limit=2)
+        server.reset_time = int(time.time()) + 2
+        server.create_repo("limited")
+        client = self.client(server)
+        bucket = self.limiter()
+
+        for _ in range(2):
+            rate_limited(client, lambda: client.get_repo("local-user/limited"), bucket)
+
+        self.assertEqual(server.remaining, 0)
+        self.assertEqual(bucket.blocked_until, server.reset_time)
+        start = time.time()
+        with mock.patch("builtins.print"):
+            bucket.acquire()
+        self.assertGreaterEqual(time.time(), server.reset_time)
+        self.assertGreater(time.time() - start, 0.5)
+        # Aucune requête refusée par le serveur
+        self.assertEqual(server.request_counts, {"GET /repos": 2})
+
+    def test_bucket_slows_down_near_the_limit(self):
+        bucket = TokenBucket(rate=5, capacity=20)
+        bucket.update(remaining=10, limit=5000, reset_time=time.time() + 100)
+
+        self.assertLessEqual(bucket.tokens, 10)
+        self.assertAlmostEqual(bucket.rate, 0.1, places=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,201 +1,741 @@
 import time
 import os
+import queue
 import threading
-import datetime
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from github import Github, Auth
-from sync_script import sync_projects, load_config, load_state, save_state, has_uncommited_changes, push_updates, Repo
+from inotify_watcher import PrunedInotifyWatcher, inotify_available
+from polling_watcher import PollingWatcher
+from sync_script import (
+    SyncContext, has_uncommited_changes, push_updates, sync_success_fields, sync_failure_fields,
+    get_repo, lease_repo, evict_idle_repos, close_repos, project_lock, ProjectLockBusy, is_self_write,
+    maintain_repository, maintenance_due,
+    push_retry_due, push_wanted, check_tracked_project, scan_projects, scan_watermark_fields,
+    get_ignore_matcher
+)
+from metrics import (
+    inc, observe, set_gauge, span, record_sync, default_profiler, MetricsServer, MetricsDumper
+)
 
 
 SYNC_DELAY = 5 
+SYNC_MAX_WAIT = 60
+SYNC_WORKERS = 4
+MAX_TRACKED_PATHS = 1000   # au-delà, la fenêtre repasse en `git add -A` complet
+EVENT_QUEUE_SIZE = 10000
+EVENT_BATCH_SIZE = 2000
+PUSH_RETRY_CHECK_INTERVAL = 5
+MAINTENANCE_IDLE = 600            # un projet est au repos après 10 min sans événement
+MAINTENANCE_CHECK_INTERVAL = 60
 
 PARENTS_DIR = ["../Projects_test"]
 
-IGNORE_PATTERNS = [
-    '.git',
-    '__pycache__',
-    '.pyc',
-    '.venv',
-    'venv',
-    '.env',
-    'node_modules',
-    '.DS_Store',
-    'tracked_repos.json',
-    '_local_'
-]
+# "pruned" : un watch inotify par dossier non ignoré (Linux uniquement)
+# "recursive" : Observer watchdog récursif sur chaque dossier parent
+# "polling" : instantanés des dossiers relus par lots (NFS, SMB, conteneurs sans inotify)
+WATCH_MODE = "pruned"
+WATCH_REPORT_INTERVAL = 600
+REPORTING_WATCHERS = (PrunedInotifyWatcher, PollingWatcher)
+PRUNING_WATCHERS = (PrunedInotifyWatcher, PollingWatcher)
 
+METRICS_PORT = None             # ex. 9464 : /metrics sur 127.0.0.1 (None : désactivé)
+METRICS_DUMP_FILE = None        # ex. "sync_metrics.json" : copie JSON périodique des métriques
+METRICS_DUMP_INTERVAL = 60
+PROFILE_SYNC = None             # nom d'un projet (ou "*") : profile sa prochaine synchro avec cProfile
+
+# Debounce scheduler: one window per project, due syncs run on a bounded pool
+class SyncScheduler:
+
+    def __init__(self, sync_function, delay=SYNC_DELAY, max_wait=SYNC_MAX_WAIT, workers=SYNC_WORKERS):
+        self.sync_function = sync_function
+        self.delay = delay
+        self.max_wait = max_wait
+        self.pending = {}     # project_path -> window (event times and changed paths)
+        self.running = set()
+        self.last_activity = {}   # project_path -> time of the last schedule()
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sync")
+        self.thread = threading.Thread(target=self._run, name="sync-scheduler", daemon=True)
+        self.thread.start()
+
+    # Without changed/deleted paths the whole project is marked dirty
+    def schedule(self, project_path, changed=None, deleted=None):
+        now = time.monotonic()
+        with self.condition:
+            self.last_activity[project_path] = now
+            window = self.pending.get(project_path)
+            is_new = window is None
+            if is_new:
+                window = {"first": now, "last": now, "changed": set(), "deleted": set(), "full": False}
+                self.pending[project_path] = window
+            else:
+                window["last"] = now
+
+            if changed is None and deleted is None:
+                window["full"] = True
+            elif not window["full"]:
+                for path in changed or ():
+                    window["deleted"].discard(path)
+                    window["changed"].add(path)
+                for path in deleted or ():
+                    window["changed"].discard(path)
+                    window["deleted"].add(path)
+                if len(window["changed"]) + len(window["deleted"]) > MAX_TRACKED_PATHS:
+                    window["full"] = True
+
+            if window["full"]:
+                window["changed"].clear()
+                window["deleted"].clear()
+
+            # Extending a window never makes it due earlier: no wake-up needed
+            if is_new:
+                self.condition.notify()
+        return is_new
+
+    # No pending or running sync and no event for `idle` seconds
+    def is_idle(self, project_path, idle):
+        with self.condition:
+            if project_path in self.pending or project_path in self.running:
+                return False
+            last = self.last_activity.get(project_path)
+            return last is None or time.monotonic() - last >= idle
+
+    def due_time(self, window):
+        return min(window["last"] + self.delay, window["first"] + self.max_wait)
+
+    def _run(self):
+        with self.condition:
+            while not self.stopped:
+                now = time.monotonic()
+                next_due = None
+
+                for project_path, window in list(self.pending.items()):
+                    if project_path in self.running:
+                        continue
+                    due = self.due_time(window)
+                    if due <= now:
+                        del self.pending[project_path]
+                        self.running.add(project_path)
+                        self.executor.submit(self._execute, project_path, window)
+                    elif next_due is None or due < next_due:
+                        next_due = due
+
+                timeout = None if next_due is None else next_due - now
+                self.condition.wait(timeout)
+
+    def _execute(self, project_path, window):
+        while True:
+            # Attente entre le premier événement de la fenêtre et la synchro
+            observe("sync_debounce_seconds", time.monotonic() - window["first"])
+            try:
+                if window["full"]:
+                    self.sync_function(project_path)
+                else:
+                    self.sync_function(project_path, window["changed"], window["deleted"])
+            except Exception as e:
+                print(f"✗ Sync worker failed for {project_path}: {e}")
+                traceback.print_exc()
+
+            with self.condition:
+                # Au moment de l'arrêt, on vide la fenêtre arrivée pendant la synchro
+                window = self.pending.pop(project_path, None) if self.stopped else None
+                if window is not None:
+                    continue
+                self.running.discard(project_path)
+                self.condition.notify()
+                return
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
+
+        # Les synchros en attente sont lancées immédiatement plutôt que perdues
+        with self.condition:
+            for project_path in list(self.pending):
+                if project_path not in self.running:
+                    window = self.pending.pop(project_path)
+                    self.running.add(project_path)
+                    self.executor.submit(self._execute, project_path, window)
+        self.executor.shutdown(wait=True)
+
+
+# Replays the persistent push queue: projects whose "pending_push" entry is
+# due are handed to the scheduler for a sync that pushes every local commit
+# in one go. A successful push anywhere means the network is back, so all
+# queued projects are then retried right away.
+class PushRetryQueue:
+
+    def __init__(self, context, scheduler, interval=PUSH_RETRY_CHECK_INTERVAL):
+        self.context = context
+        self.scheduler = scheduler
+        self.interval = interval
+        self.scheduled = {}   # project_path -> next_attempt already handed to the scheduler
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="push-retry", daemon=True)
+
+    def start(self):
+        with self.context.lock:
+            queued = [path for path, entry in self.context.state.items()
+                      if isinstance(entry, dict) and entry.get("pending_push")]
+        if queued:
+            print(f"📤 {len(queued)} project(s) waiting for a push from a previous run.")
+        self.thread.start()
+
+    def due_projects(self):
+        now = time.time()
+        with self.context.lock:
+            return {path: entry["pending_push"]["next_attempt"] for path, entry in self.context.state.items()
+                    if isinstance(entry, dict) and push_retry_due(entry, now)}
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            for project_path, next_attempt in self.due_projects().items():
+                if self.scheduled.get(project_path) != next_attempt:
+                    self.scheduled[project_path] = next_attempt
+                    self.scheduler.schedule(project_path)
+            self.wake_event.wait(self.interval)
+            self.wake_event.clear()
+
+    def on_push_succeeded(self):
+        now = time.time()
+        with self.context.lock:
+            queued = [path for path, entry in self.context.state.items()
+                      if isinstance(entry, dict) and entry.get("pending_push")
+                      and entry["pending_push"].get("next_attempt", 0) > now]
+        if not queued:
+            return
+        for project_path in queued:
+            entry = self.context.get_project(project_path)
+            self.context.update_project(project_path, pending_push={**entry["pending_push"], "next_attempt": now})
+        print(f"📶 Push succeeded: retrying {len(queued)} queued project(s) now.")
+        self.wake_event.set()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+        self.thread.join()
+
+
+# Reconciliation pass run at startup and after an observer restart: finds
+# the projects changed while nothing was watching them, with the same checks
+# as sync_projects (watermark, fingerprint, unpushed commits), and hands them
+# to the scheduler like a file event would. Runs in the background so events
+# are handled meanwhile; the scheduler keeps one sync per project at a time.
+class Reconciler:
+
+    def __init__(self, context, handler, parents, workers=SYNC_WORKERS):
+        self.context = context
+        self.handler = handler
+        self.parents = parents
+        self.workers = workers
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, name="reconcile", daemon=True)
+        self.thread.start()
+
+    def _check(self, project_path):
+        if self.stop_event.is_set():
+            return "cancelled"
+
+        entry = self.context.get_project(project_path)
+        if entry is None:
+            self.handler.schedule_sync(project_path)
+            return "new"
+
+        started_ns = time.time_ns()
+        with span("dirty_check"):
+            unchanged, index = check_tracked_project(project_path, entry)
+        if not unchanged:
+            self.handler.schedule_sync(project_path)
+            return "changed"
+        if index is not None:
+            self.context.update_project(project_path, **scan_watermark_fields(project_path, started_ns))
+        return "unchanged"
+
+    def _run(self):
+        start = time.perf_counter()
+        with span("scan"):
+            projects = scan_projects(self.parents, verbose=False)
+        counts = {"new": 0, "changed": 0, "unchanged": 0, "failed": 0, "cancelled": 0}
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reconcile") as executor:
+            futures = {executor.submit(self._check, path): path for path in projects}
+            for future in as_completed(futures):
+                try:
+                    counts[future.result()] += 1
+                except Exception as e:
+                    counts["failed"] += 1
+                    print(f"✗ Reconciliation failed for {futures[future]}: {e}")
+
+        print(f"🔎 Reconciled {len(projects)} project(s) in {time.perf_counter() - start:.2f}s: "
+              f"{counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged, "
+              f"{counts['failed']} failed.")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+# Background repository maintenance (gc --auto, commit-graph,
+# multi-pack-index), at most once per MAINTENANCE_INTERVAL per project and
+# only while the project is idle. One project at a time, under the project
+# lock; the cost of each run is kept in the project state.
+class MaintenanceScheduler:
+
+    def __init__(self, context, scheduler, idle=MAINTENANCE_IDLE, interval=MAINTENANCE_CHECK_INTERVAL):
+        self.context = context
+        self.scheduler = scheduler
+        self.idle = idle
+        self.interval = interval
+        self.total_seconds = 0.0
+        self.runs = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def due_projects(self):
+        now = time.time()
+        with self.context.lock:
+            return [path for path, entry in self.context.state.items() if maintenance_due(entry, now)]
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            for project_path in self.due_projects():
+                if self.stop_event.is_set():
+                    return
+                if not self.scheduler.is_idle(project_path, self.idle) or not os.path.isdir(project_path):
+                    continue
+                try:
+                    with project_lock(project_path), lease_repo(project_path):
+                        fields = maintain_repository(project_path)
+                except ProjectLockBusy:
+                    continue
+                except Exception as e:
+                    print(f"✗ Maintenance failed for {project_path}: {e}")
+                    fields = {"last_maintenance": time.time()}
+                self.context.update_project(project_path, **fields)
+                self.runs += 1
+                self.total_seconds += fields.get("maintenance_seconds", 0)
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        if self.runs:
+            print(f"🧹 {self.runs} maintenance run(s), {self.total_seconds:.1f}s in total.")
+
+
+# Maps an absolute path to (project_path, path relative to the project)
+# using the parent directories as precomputed prefixes: no abspath/relpath
+# per event.
+class ProjectIndex:
+
+    def __init__(self, parents):
+        self.prefixes = sorted((os.path.abspath(parent) + os.sep for parent in parents), key=len, reverse=True)
+
+    def resolve(self, path):
+        if not os.path.isabs(path):
+            path = os.path.abspath(path)
+        for prefix in self.prefixes:
+            if path.startswith(prefix):
+                project_name, sep, rel_path = path[len(prefix):].partition(os.sep)
+                if not sep or not project_name or not rel_path:
+                    # Le dossier parent, un projet lui-même ou un fichier posé dans le parent
+                    return prefix + project_name if project_name and not sep else None, None
+                return prefix + project_name, rel_path
+        return None, None
+
+
+# Watchdog callbacks only push (path, deleted) on a bounded queue. A single
+# pipeline thread drains it in batches, dedupes per project and path,
+# filters ignored paths and hands one update per project to the scheduler.
+# When the queue is full, events collapse into a "project dirty" flag
+# (full sync) instead of piling up.
 class ChangeHandler(FileSystemEventHandler):
 
-    def __init__(self):
-        self.last_sync_time = {}
-        self.sync_timer = None
-        self.lock = threading.Lock()
+    def __init__(self, context, parents=None):
+        self.context = context
+        self.project_index = ProjectIndex(parents or PARENTS_DIR)
+        self.scheduler = SyncScheduler(self.run_sync)
+        self.retry_queue = None
+        self.reconciler = None
+        self.maintenance = None
+        self.observer = None
+        self.events = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self.dirty_projects = set()
+        self.dirty_lock = threading.Lock()
+        self.events_overflowed = 0
+        set_gauge("event_queue_depth", self.events.qsize)
+        set_gauge("syncs_pending", lambda: len(self.scheduler.pending))
+        set_gauge("syncs_running", lambda: len(self.scheduler.running))
+        self.pipeline = threading.Thread(target=self._drain_events, name="event-pipeline", daemon=True)
+        self.pipeline.start()
 
-    def to_ignore(self, path):
-        for pattern in IGNORE_PATTERNS:
-            if pattern in path:
-                return True
-        return False
-    
-    def schedule_sync(self, project_path):
-        with self.lock:
-            if self.sync_timer and self.sync_timer.is_alive():
-                self.sync_timer.cancel()
-            
-        self.sync_timer = threading.Timer(
-            SYNC_DELAY, 
-            self.trigger_sync,
-            args=[project_path]
-        )
-        self.sync_timer.start()
-        print(f"Scheduled sync for {project_path} in {SYNC_DELAY} seconds.")
-
-    def trigger_sync(self, project_path):
-        project_name = os.path.basename(project_path)
+    # Filtre compilé par projet : IGNORE_PATTERNS + .gitignore du projet
+    def to_ignore(self, path, is_dir=False):
+        project_path, rel_path = self.project_index.resolve(path)
+        if rel_path is None:
+            return True
+        return self._ignored_in_project(project_path, rel_path.replace(os.sep, "/"), is_dir)
 
-        last_sync = self.last_sync_time.get(project_path, 0)
-        current_time = time.time()
+    def _ignored_in_project(self, project_path, rel_path, is_dir=False):
+        return get_ignore_matcher(project_path).match(rel_path, is_dir)
 
-        if current_time - last_sync < SYNC_DELAY:
-            print(f"⏭ Skipping sync for {project_name} (last sync was too recent).")
+    # Rule files are stat'ed once per project and batch (.git/info/exclude
+    # is not watched); the .gitignore of subfolders are reported as events.
+    # When they changed, the observer re-prunes the project and a full sync
+    # picks up the files that are no longer ignored.
+    def refresh_ignore_rules(self, project_path, nested_changed=False):
+        matcher = get_ignore_matcher(project_path)
+        if get_ignore_matcher(project_path, revalidate=True) is matcher and not nested_changed:
             return
+        if isinstance(self.observer, PRUNING_WATCHERS):
+            self.observer.request_rescan(project_path)
+        self.schedule_sync(project_path)
+    
+    def schedule_sync(self, project_path, changed=None, deleted=None):
+        if self.scheduler.schedule(project_path, changed, deleted):
+            print(f"Scheduled sync for {project_path} in {SYNC_DELAY} seconds.")
+
+    def enqueue_event(self, path, deleted=False):
+        inc("events_received_total")
+        try:
+            self.events.put_nowait((path, deleted))
+        except queue.Full:
+            # Surcharge : on ne garde que le projet, synchronisé en entier
+            project_path, rel_path = self.project_index.resolve(path)
+            if rel_path is None or self.to_ignore(path):
+                return
+            with self.dirty_lock:
+                if not self.dirty_projects:
+                    print(f"⚠ Event queue full ({EVENT_QUEUE_SIZE}), collapsing events to project-level syncs.")
+                self.dirty_projects.add(project_path)
+                self.events_overflowed += 1
+            inc("events_overflowed_total")
+
+    def _drain_events(self):
+        while True:
+            item = self.events.get()
+            if item is None:
+                return
+            batch = [item]
+            try:
+                while len(batch) < EVENT_BATCH_SIZE:
+                    item = self.events.get_nowait()
+                    if item is None:
+                        self.events.put(None)
+                        break
+                    batch.append(item)
+            except queue.Empty:
+                pass
+
+            try:
+                self.process_batch(batch)
+            except Exception as e:
+                print(f"✗ Error while processing file events: {e}")
+                traceback.print_exc()
+
+    def process_batch(self, batch):
+        # Dernier état connu de chaque chemin, par projet
+        latest = {}
+        for path, deleted in batch:
+            latest[path] = deleted
+
+        with self.dirty_lock:
+            dirty_projects, self.dirty_projects = self.dirty_projects, set()
+
+        projects = {self.project_index.resolve(path)[0] for path in latest}
+        rules_changed = {self.project_index.resolve(path)[0] for path in latest
+                         if os.path.basename(path) == ".gitignore"}
+        for project_path in (projects | dirty_projects) - {None}:
+            self.refresh_ignore_rules(project_path, project_path in rules_changed)
+
+        changes = {}
+        ignored = {"coalesced": len(batch) - len(latest), "outside": 0, "ignored": 0, "self_write": 0}
+        for path, deleted in latest.items():
+            project_path, rel_path = self.project_index.resolve(path)
+            if rel_path is None or project_path in dirty_projects:
+                ignored["outside" if rel_path is None else "coalesced"] += 1
+                continue
+            if self._ignored_in_project(project_path, rel_path.replace(os.sep, "/")):
+                ignored["ignored"] += 1
+                continue
+            # Écho d'une écriture du démon lui-même (fusion, copie _local_, .gitignore)
+            if is_self_write(path):
+                ignored["self_write"] += 1
+                continue
+            changed_paths, deleted_paths = changes.setdefault(project_path, ([], []))
+            (deleted_paths if deleted else changed_paths).append(project_path + os.sep + rel_path)
+
+        for reason, count in ignored.items():
+            if count:
+                inc("events_ignored_total", count, reason=reason)
+
+        for project_path in dirty_projects:
+            self.schedule_sync(project_path)
+        for project_path, (changed_paths, deleted_paths) in changes.items():
+            self.schedule_sync(project_path, changed_paths, deleted_paths)
+
+    def stop(self):
+        self.events.put(None)
+        self.pipeline.join()
+        if self.reconciler is not None:
+            self.reconciler.stop()
+        if self.retry_queue is not None:
+            self.retry_queue.stop()
+        if self.maintenance is not None:
+            self.maintenance.stop()
+        self.scheduler.stop()
+
+    # Runs one sync with the project locked (against a cron run of
+    # sync_script.py) and its Repo handle kept open in the pool. If the
+    # project is locked, the window goes back to the scheduler and is merged
+    # with any later event into a single follow-up sync.
+    def run_sync(self, project_path, changed_paths=None, deleted_paths=None):
+        # Événements arrivés avant que le démon n'ait enregistré ses propres écritures
+        if changed_paths is not None or deleted_paths is not None:
+            count = len(changed_paths) + len(deleted_paths)
+            changed_paths = [path for path in changed_paths if not is_self_write(path)]
+            deleted_paths = [path for path in deleted_paths if not is_self_write(path)]
+            remaining = len(changed_paths) + len(deleted_paths)
+            if remaining < count:
+                inc("events_ignored_total", count - remaining, reason="self_write")
+            if not remaining:
+                print(f"ℹ️ Only self-written files changed in {os.path.basename(project_path)}. Nothing to sync.")
+                return
+        try:
+            with project_lock(project_path), lease_repo(project_path):
+                start = time.perf_counter()
+                with default_profiler.profile(project_path):
+                    status = self.trigger_sync(project_path, changed_paths, deleted_paths)
+                record_sync(os.path.basename(project_path), status, time.perf_counter() - start)
+        except ProjectLockBusy:
+            inc("syncs_total", status="locked")
+            # À l'arrêt, le rattrapage du prochain démarrage prendra le relais
+            if self.scheduler.stopped:
+                print(f"🔒 {os.path.basename(project_path)} is locked by another sync. Left for the next start.")
+                return
+            print(f"🔒 {os.path.basename(project_path)} is locked by another sync. Retrying later.")
+            self.scheduler.schedule(project_path, changed_paths, deleted_paths)
+
+    # Returns "synced", "unchanged" or "failed"
+    def trigger_sync(self, project_path, changed_paths=None, deleted_paths=None):
+        project_name = os.path.basename(project_path)
         
         print(f"\n{'='*60}")
         print(f"🔄 Triggering sync for {project_name}...")
         print(f"{'='*60}")
 
-        try:
-            token, username, email = load_config()
-            auth = Auth.Token(token)
-            github_client = Github(auth=auth)
-            state = load_state()
+        context = self.context
 
+        try:
             # Vérifier si le projet est déjà tracké
-            if project_path not in state:
+            if not context.is_tracked(project_path):
                 print(f"📦 New project detected: {project_name}")
                 print(f"⚠ Running initial setup via sync_projects...")
                 
-                # Utiliser sync_projects pour initialiser le nouveau projet
-                temp_projects = {project_path: None}
-                
                 # Créer le repo GitHub et initialiser
-                from sync_script import create_github_repo, initialize_local_repo
+                from sync_script import create_github_repo, initialize_local_repo, make_repo_name
                 
-                repo_name = project_name.replace(" ", "-").replace("_", "-").lower()
-                repo_name = "".join(c for c in repo_name if c.isalnum() or c == "-")
+                repo_name = make_repo_name(project_name)
                 
                 print(f"📝 Creating GitHub repository: {repo_name}")
                 repo_url = create_github_repo(
                     repo_name=repo_name,
                     is_private=True,
                     description=f"Project: {project_name}",
-                    github_client=github_client,
-                    username=username
+                    github_client=context.github_client,
+                    username=context.username,
+                    catalog=context.catalog
                 )
                 
                 if not repo_url:
                     print(f"✗ Failed to create GitHub repo for {project_name}")
-                    return
+                    return "failed"
                 
                 print(f"🔧 Initializing local repository...")
                 if initialize_local_repo(project_path, repo_url):
-                    state[project_path] = {
-                        "repo_name": repo_name,
-                        "repo_url": repo_url,
-                        "last_sync": datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
-                    }
-                    save_state(state)
+                    context.update_project(
+                        project_path,
+                        repo_name=repo_name,
+                        repo_url=repo_url,
+                        **sync_success_fields(project_path)
+                    )
                     print(f"✅ {project_name} initialized and synced successfully!")
-                else:
-                    print(f"✗ Failed to initialize {project_name}")
-                
-                self.last_sync_time[project_path] = current_time
-                return
+                    return "synced"
+
+                print(f"✗ Failed to initialize {project_name}")
+                return "failed"
 
             # Pour les projets existants
             try:
-                repo = Repo(project_path)
+                entry = context.get_project(project_path)
+                started_ns = time.time_ns()
+                full_check = changed_paths is None and deleted_paths is None
+                retry_push = push_wanted(project_path, entry)
 
-                if has_uncommited_changes(repo):
+                # Les chemins remontés par le watcher suffisent : pas de scan complet
+                with span("dirty_check"):
+                    uncommitted = full_check and has_uncommited_changes(get_repo(project_path))
+
+                if not full_check:
+                    print(f"📝 {len(changed_paths) + len(deleted_paths)} changed path(s). Pushing updates...")
+                elif uncommitted:
                     print(f"📝 Uncommitted changes detected. Pushing updates...")
-                    if push_updates(project_path, f"Auto-sync: {project_name}"): 
-                        state[project_path]["last_sync"] = datetime.datetime.now(tz=datetime.timezone.utc).isoformat() 
-                        save_state(state)
-                        print(f"✅ {project_name} synced successfully.")
-                    else:
-                        print(f"✗ Failed to push updates for {project_name}.")
+                elif retry_push and entry.get("pending_push"):
+                    print(f"📤 Retrying queued push (attempt {entry['pending_push']['attempts'] + 1})...")
+                elif retry_push:
+                    print("📤 Local commits not pushed yet. Pushing updates...")
                 else:
                     print(f"ℹ️ No changes to sync for {project_name}.")
+                    context.update_project(project_path, **scan_watermark_fields(project_path, started_ns))
+                    return "unchanged"
+
+                if push_updates(project_path, f"Auto-sync: {project_name}", changed_paths, deleted_paths, entry,
+                                push_if_clean=retry_push):
+                    # Après une vérification complète, le repère du scan incrémental avance aussi
+                    watermark = scan_watermark_fields(project_path, started_ns) if full_check else {}
+                    context.update_project(project_path, **sync_success_fields(project_path, entry), **watermark)
+                    print(f"✅ {project_name} synced successfully.")
+                    if self.retry_queue is not None:
+                        self.retry_queue.on_push_succeeded()
+                    return "synced"
+
+                context.update_project(project_path, **sync_failure_fields(entry))
+                print(f"✗ Failed to push updates for {project_name}. Push queued for retry.")
+                return "failed"
                     
             except Exception as e:
+                context.update_project(project_path, **sync_failure_fields(context.get_project(project_path)))
                 print(f"✗ Error syncing {project_name}: {e}")
                 traceback.print_exc()
-
-            self.last_sync_time[project_path] = current_time
+                return "failed"
 
         except Exception as e:
             print(f"✗ Critical error during sync for {project_name}: {e}")
             traceback.print_exc()
+            return "failed"
 
     def on_modified(self, event):
-        if event.is_directory or self.to_ignore(event.src_path):
-            return
-        
-        project_path = self.get_project_path(event.src_path)
-        if project_path:
-            self.schedule_sync(project_path)
+        if not event.is_directory:
+            self.enqueue_event(event.src_path)
 
     def on_created(self, event):
-        if event.is_directory or self.to_ignore(event.src_path):
-            return
-        
-        project_path = self.get_project_path(event.src_path)
-        if project_path:
-            self.schedule_sync(project_path)
+        if not event.is_directory:
+            self.enqueue_event(event.src_path)
 
     def on_deleted(self, event):
-        if event.is_directory or self.to_ignore(event.src_path):
-            return
-        
-        project_path = self.get_project_path(event.src_path)
-        if project_path:
-            self.schedule_sync(project_path)
+        self.enqueue_event(event.src_path, deleted=True)
 
-    def get_project_path(self, file_path):
-        for parent in PARENTS_DIR:
-            abs_parent = os.path.abspath(parent)
-            abs_file = os.path.abspath(file_path)
-            
-            if abs_file.startswith(abs_parent):
-                relative_path = os.path.relpath(file_path, abs_parent)
-                project_name = relative_path.split(os.sep)[0]
-                return os.path.join(abs_parent, project_name)
-            
-        return None
+    # Un renommage = suppression de l'ancien chemin + création du nouveau
+    def on_moved(self, event):
+        self.enqueue_event(event.src_path, deleted=True)
+        self.enqueue_event(event.dest_path)
     
 def start_watching():
-    event_handler = ChangeHandler()
-    observer = Observer()
+    try:
+        context = SyncContext()
+    except ValueError as e:
+        print(f"✗ Configuration error: {e}")
+        return
 
+    parents = [os.path.abspath(parent) for parent in PARENTS_DIR if os.path.exists(parent)]
     for parent in PARENTS_DIR:
-        if os.path.exists(parent):
-            observer.schedule(event_handler, parent, recursive=True)
-            print(f"Started watching directory: {parent}")
-        else:
+        if not os.path.exists(parent):
             print(f"Directory does not exist: {parent}")
-        
+    metrics_server = start_metrics_server()
+    metrics_dumper = MetricsDumper(METRICS_DUMP_FILE, METRICS_DUMP_INTERVAL).start() if METRICS_DUMP_FILE else None
+    if PROFILE_SYNC:
+        default_profiler.arm(PROFILE_SYNC)
+
+    event_handler = ChangeHandler(context, parents)
+    event_handler.retry_queue = PushRetryQueue(context, event_handler.scheduler)
+    event_handler.retry_queue.start()
+    event_handler.reconciler = Reconciler(context, event_handler, parents)
+    event_handler.maintenance = MaintenanceScheduler(context, event_handler.scheduler)
+    event_handler.maintenance.start()
+
+    observer = create_observer(event_handler, parents)
+    event_handler.observer = observer
     observer.start()
+    for parent in parents:
+        print(f"Started watching directory: {parent}")
+    if isinstance(observer, REPORTING_WATCHERS):
+        observer.report()
+
+    # Rattrapage des modifications faites pendant que le démon était arrêté
+    event_handler.reconciler.start()
 
     try:
+        last_report = time.monotonic()
         while True:
             time.sleep(1)
+            evict_idle_repos()
+            if not observer.is_alive():
+                print("⚠ Observer stopped unexpectedly. Restarting it...")
+                observer.join(1)
+                observer = create_observer(event_handler, parents)
+                event_handler.observer = observer
+                observer.start()
+                event_handler.reconciler.start()
+            if isinstance(observer, REPORTING_WATCHERS) and time.monotonic() - last_report >= WATCH_REPORT_INTERVAL:
+                observer.report()
+                last_report = time.monotonic()
     except KeyboardInterrupt:
         observer.stop()
 
     observer.join()
+    if isinstance(observer, REPORTING_WATCHERS):
+        observer.report()
+    event_handler.stop()
+    close_repos()
+    context.close()
+    if metrics_dumper is not None:
+        metrics_dumper.stop()
+    if metrics_server is not None:
+        metrics_server.stop()
     print("Stopped watching.")
 
+
+# Local metrics endpoint, only when METRICS_PORT is set; a busy port only
+# disables it. Bound to the loopback: POST /profile is not authenticated.
+def start_metrics_server():
+    if METRICS_PORT is None:
+        return None
+    try:
+        return MetricsServer(METRICS_PORT, host="127.0.0.1").start()
+    except OSError as e:
+        print(f"⚠ Metrics endpoint unavailable on port {METRICS_PORT} ({e}).")
+        return None
+
+
+# Pruned per-directory inotify watches when available, snapshot polling on
+# request, watchdog otherwise
+def create_observer(event_handler, parents):
+    if WATCH_MODE == "polling":
+        return PollingWatcher(event_handler, parents, event_handler.to_ignore)
+    if WATCH_MODE == "pruned" and inotify_available():
+        try:
+            return PrunedInotifyWatcher(event_handler, parents, event_handler.to_ignore)
+        except OSError as e:
+            print(f"⚠ Pruned inotify watcher unavailable ({e}), using recursive observer.")
+
+    observer = Observer()
+    for parent in parents:
+        observer.schedule(event_handler, parent, recursive=True)
+    return observer
+
 if __name__ == "__main__":
     start_watching()
\ No newline at end of file